@@ -8,9 +8,16 @@ import typing
 import abc
 import logging
 import tzlocal
+import contextlib
+import json
+import os
+import queue
+import threading
 
 import selenium.webdriver.support
 import selenium.webdriver.support.select
+import selenium.webdriver.support.wait
+import selenium.common.exceptions
 @dataclasses.dataclass
 class EventInfo:
     title : str
@@ -35,6 +42,9 @@ class EventConfirmationInfo:
 class ANAutomatorConfig:
     email: str
     password: str
+    # If set, the session cookies are saved here after logging in and loaded by new browsers so they don't log in again.
+    # The file is only readable by the current user.
+    cookiesPath: typing.Optional[str] = None
 
 class Utils:
 
@@ -44,12 +54,41 @@ class Utils:
         elem.send_keys(text)
 
 class Screen(abc.ABC):
-
-    @classmethod
-    def tryToCreate(self, driver, *args, **kwargs) -> typing.Optional[typing.Self]:
-        screen = self(driver, *args, **kwargs)
-        if not screen.exists():
+    class Constants:
+        # Implicit wait used while filling out screens, so elements which appear after an interaction can be found
+        IMPLICIT_WAIT_SEC = 2
+        # How long waitFor waits for a screen and how often it checks
+        WAIT_TIMEOUT_SEC = 10
+        WAIT_POLL_SEC = 0.1
+
+    # A locator (By, value) for an element only on this screen, checked before exists() when waiting for screens
+    MARKER: tuple[str, str] = None
+
+    # Waits until one of the screens is shown and returns it, checking each screen's marker on every poll so it returns
+    # as soon as the page is ready, whichever of the screens it is. exists() is checked on every poll while a page is
+    # still rendering, so it logs missing elements as info and only the final timeout is an error.
+    @staticmethod
+    def waitFor(driver, screenTypes: list[type["Screen"]], timeout: float = Constants.WAIT_TIMEOUT_SEC) -> "Screen":
+        def shownScreen(driver) -> typing.Optional[Screen]:
+            for screenType in screenTypes:
+                if len(driver.find_elements(*screenType.MARKER)) > 0:
+                    screen = screenType(driver)
+                    if screen.exists():
+                        return screen
             return None
+
+        names = ", ".join(screenType.__name__ for screenType in screenTypes)
+        logging.info("Screen: Waiting for one of %s", names)
+        # Without an implicit wait a missing element is reported immediately instead of after the implicit wait
+        driver.implicitly_wait(0)
+        try:
+            screen = selenium.webdriver.support.wait.WebDriverWait(driver, timeout, poll_frequency=Screen.Constants.WAIT_POLL_SEC).until(shownScreen)
+        except selenium.common.exceptions.TimeoutException:
+            logging.error("Screen: None of %s shown after %s seconds", names, str(timeout))
+            raise Exception(f"Not in any of {names}")
+        finally:
+            driver.implicitly_wait(Screen.Constants.IMPLICIT_WAIT_SEC)
+        logging.info("Screen: %s shown", type(screen).__name__)
         return screen
 
     def __init__(self, driver):
@@ -69,6 +108,8 @@ class LoginScreen(Screen):
         PASSWORD_ID = "iptpassword"
         SUBMIT_ID = "commit"
 
+    MARKER = (By.ID, IDs.EMAIL_ID)
+
     def exists(self) -> bool:
         try:
             _ = self._emailBox()
@@ -117,6 +158,8 @@ class DashboardScreen(Screen):
 
     class ActionsInCreateActionMenu:
         EVENT = "Event"
+
+    MARKER = (By.CLASS_NAME, Classes.MANAGING_TITLE)
     
     def __init__(self, driver, groupText = "Austin DSA"):
         super().__init__(driver)
@@ -135,7 +178,7 @@ class DashboardScreen(Screen):
                     found = True
                     break
             if not found: 
-                logging.error("DashboardScreen: Couldn't find currently managing text")
+                logging.info("DashboardScreen: Couldn't find currently managing text")
                 return False
             
             h2s = containgDiv.find_elements(By.TAG_NAME, "h2")
@@ -145,7 +188,7 @@ class DashboardScreen(Screen):
                     found = True
                     break
             if not found: 
-                logging.error("DashboardScreen: Couldn't find group text %s", self.groupText)
+                logging.info("DashboardScreen: Couldn't find group text %s", self.groupText)
                 return False
             
             logging.info("DashboardScreen: Exists")
@@ -189,6 +232,8 @@ class EditEventScreen(Screen):
         DATETIME_PICKER_PREV = "prev"
 
         DATETIME_PICKER_DAY = "day"
+
+    MARKER = (By.ID, IDs.TITLE_INPUT)
     
 
     def _titleInputBox(self):
@@ -249,6 +294,48 @@ class EditEventScreen(Screen):
             logging.info("EditEventScreen: Does not exist %s", str(e))
             return False
         
+    # Sets the date and time through the page's datetimepicker jQuery plugin in one script, dispatching the events a
+    # user's input would. The plugin is asked for its date afterwards, so this returns True only if the date was set
+    # exactly. The minutes are rounded down to 15 like the datetime picker.
+    SET_DATE_SCRIPT = """
+        var input = arguments[0];
+        var date = new Date(arguments[1], arguments[2] - 1, arguments[3], arguments[4], arguments[5]);
+        if (typeof jQuery === "undefined") {
+            return false;
+        }
+        // The picker is attached to the input, or to its parent for pickers with an add-on button
+        var element = [input, input.parentNode].find(function (e) { return jQuery(e).data("datetimepicker"); });
+        if (element === undefined) {
+            return false;
+        }
+        var picker = jQuery(element).data("datetimepicker");
+        picker.update(date);
+        input.dispatchEvent(new Event("input", {bubbles: true}));
+        input.dispatchEvent(new Event("change", {bubbles: true}));
+        jQuery(element).trigger({type: "changeDate", date: picker.getDate()});
+        var set = picker.getDate();
+        return set.getFullYear() === date.getFullYear() && set.getMonth() === date.getMonth() &&
+            set.getDate() === date.getDate() && set.getHours() === date.getHours() &&
+            set.getMinutes() === date.getMinutes();
+    """
+
+    def _setDateWithScript(self, time: datetime.datetime, inputBox) -> bool:
+        minute = time.minute - time.minute % 15
+        try:
+            return self.driver.execute_script(EditEventScreen.SET_DATE_SCRIPT, inputBox, time.year, time.month, time.day, time.hour, minute) is True
+        except Exception as e:
+            logging.info("EditEventScreen: Could not set date with script %s", str(e))
+            return False
+
+    # Sets the date with a script if possible, otherwise by clicking through the datetime picker
+    def _fillOutDate(self, time: datetime.datetime, inputBox, dateTimePicker: typing.Callable[[], typing.Any]):
+        if self._setDateWithScript(time, inputBox):
+            logging.info("EditEventScreen: Set date %s with script", str(time))
+            return
+        logging.info("EditEventScreen: Setting date %s with script failed, using the date picker", str(time))
+        inputBox.click()
+        self._fillOutDatePicker(time, dateTimePicker())
+
     def _fillOutDatePicker(self, time: datetime.datetime, dateTimePicker):
         inCorrectMonthYear = False
         wantedMonthYearText = time.strftime("%B %Y")
@@ -350,14 +437,12 @@ class EditEventScreen(Screen):
         countrySelectDropdown.select_by_value(eventInfo.country)
 
         logging.info("EditEventScreen: Setting start date to %s", str(eventInfo.startTime))
-        self._startDateInputBox().click()
-        self._fillOutDatePicker(eventInfo.startTime, self._startDateTimePicker())
+        self._fillOutDate(eventInfo.startTime, self._startDateInputBox(), self._startDateTimePicker)
 
         if eventInfo.endTime is not None:
             logging.info("EditEventScreen: Setting end date to %s", str(eventInfo.endTime))
             self._hasEndTimeICheckBox().click()
-            self._endDateInputBox().click()
-            self._fillOutDatePicker(eventInfo.endTime, self._endDateTimePicker())
+            self._fillOutDate(eventInfo.endTime, self._endDateInputBox(), self._endDateTimePicker)
 
     def goToNextStep(self):
         self._nextStepButton().click()
@@ -370,6 +455,9 @@ class EditEventThankYouScreen(Screen):
         # The actual text area isn't editable as it is hidden. I don't like using this id since it looks auto-generated and therefore could become useless but works for now
         INSTRUCTIONS_INPUT = "redactor-uuid-0"#"event-description"
         PUBLISH_BUTTON = "event-publish_link_button"
+
+    # The instructions heading, ignoring case like exists()
+    MARKER = (By.XPATH, f"//h3[translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz') = '{TEXTS.INSTRUCTIONS.lower()}']")
     
     def _publishButton(self):
         return self.driver.find_element(By.ID, EditEventThankYouScreen.IDs.PUBLISH_BUTTON)
@@ -385,7 +473,7 @@ class EditEventThankYouScreen(Screen):
                 found = True
                 break
         if not found: 
-            logging.error("EditEventThankYouScreen: Couldn't find instructions text")
+            logging.info("EditEventThankYouScreen: Couldn't find instructions text")
             return False
         try:
             _ = self._publishButton()
@@ -407,6 +495,8 @@ class EventConfirmationScreen(Screen):
     
     class NAMES:
         DIRECT_LINK = "event-share_link"
+
+    MARKER = (By.NAME, NAMES.DIRECT_LINK)
     
     def _directLinkBox(self):
         return self.driver.find_element(By.NAME, EventConfirmationScreen.NAMES.DIRECT_LINK)
@@ -419,7 +509,7 @@ class EventConfirmationScreen(Screen):
                 found = True
                 break
         if not found: 
-            logging.error("EventConfirmationScreen: Couldn't find currently managing text text")
+            logging.info("EventConfirmationScreen: Couldn't find currently managing text text")
             return False
         try:
             _ = self._directLinkBox()
@@ -434,10 +524,146 @@ class EventConfirmationScreen(Screen):
     def getDirectLink(self) -> str:
         return self._directLinkBox().get_attribute("value")
 
+# Keeps up to size headless browsers open and logged in, so creating many events doesn't start a browser and log in
+# for each one. Use driver() to borrow one, a browser which fails while borrowed is quit and replaced by a new one.
+class DriverPool:
+    class Constants:
+        AN_URL = "https://actionnetwork.org/"
+
+    def __init__(self, config: ANAutomatorConfig, size: int = 1):
+        self.config = config
+        self.size = size
+        # Idle drivers, None stands for a driver which hasn't been started yet
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(None)
+        # Started drivers which are borrowed right now, so close can quit them without waiting for them to be returned
+        self._borrowed = set()
+        self._lock = threading.Lock()
+
+    def _startDriver(self):
+        logging.info("DriverPool: Starting Driver")
+        options = selenium.webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        driver = selenium.webdriver.Chrome(options)
+        driver.implicitly_wait(Screen.Constants.IMPLICIT_WAIT_SEC)
+        self._loadCookies(driver)
+        return driver
+
+    def _loadCookies(self, driver):
+        if self.config.cookiesPath is None or not os.path.exists(self.config.cookiesPath):
+            return
+        logging.info("DriverPool: Loading cookies from %s", self.config.cookiesPath)
+        try:
+            with open(self.config.cookiesPath, "r", encoding="utf8") as file:
+                cookies = json.load(file)
+            # Cookies can only be added for the domain of the current page
+            driver.get(DriverPool.Constants.AN_URL)
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+        except Exception as e:
+            logging.error("DriverPool: Could not load cookies, will log in again %s", str(e))
+
+    def _saveCookies(self, driver):
+        if self.config.cookiesPath is None:
+            return
+        logging.info("DriverPool: Saving cookies to %s", self.config.cookiesPath)
+        # Make the file readable only by us, since the cookies give access to the account. The mode passed to open is
+        # only used when creating the file, so also change the mode of an existing file before writing to it.
+        # Saving the cookies only saves logging in next time, so a failure doesn't stop this browser from being used.
+        try:
+            fd = os.open(self.config.cookiesPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, "w", encoding="utf8") as file:
+                json.dump(driver.get_cookies(), file)
+        except OSError as e:
+            logging.error("DriverPool: Could not save cookies to %s %s", self.config.cookiesPath, str(e))
+
+    # Opens the dashboard, logging in if the session expired
+    def _openDashboard(self, driver) -> "DashboardScreen":
+        driver.get(DashboardScreen.Constants.AUSTIN_DSA_DASHBOARD)
+
+        logging.info("DriverPool: Checking if we need to login")
+        screen = Screen.waitFor(driver, [DashboardScreen, LoginScreen])
+        if isinstance(screen, DashboardScreen):
+            return screen
+        logging.info("DriverPool: LoginScreen detected, logging in")
+        screen.login(email=self.config.email, password=self.config.password)
+        dashboardScreen = Screen.waitFor(driver, [DashboardScreen])
+        self._saveCookies(driver)
+        return dashboardScreen
+
+    # Borrows a driver, yielding it with its dashboard screen open. Waits if every driver is borrowed.
+    @contextlib.contextmanager
+    def driver(self):
+        driver = self._idle.get()
+        try:
+            if driver is None:
+                driver = self._startDriver()
+            with self._lock:
+                self._borrowed.add(driver)
+            dashboardScreen = self._openDashboard(driver)
+            yield (driver, dashboardScreen)
+        except Exception:
+            logging.error("DriverPool: Driver failed, recycling it")
+            self._return(driver, failed=True)
+            raise
+        self._return(driver, failed=False)
+
+    def _return(self, driver, failed: bool):
+        with self._lock:
+            # The driver isn't borrowed anymore if the pool was closed in the meantime, which quit it already
+            borrowed = driver in self._borrowed
+            self._borrowed.discard(driver)
+            if borrowed and not failed:
+                self._idle.put(driver)
+                return
+            self._idle.put(None)
+        if driver is not None:
+            self._quit(driver)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.error("DriverPool: Could not quit driver %s", str(e))
+
+    # Quits every driver, including borrowed ones which are still being used. The pool can be used again afterwards.
+    def close(self):
+        logging.info("DriverPool: Quitting drivers")
+        with self._lock:
+            drivers = list(self._borrowed)
+            self._borrowed.clear()
+            idle = 0
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                idle += 1
+                if driver is not None:
+                    drivers.append(driver)
+            for _ in range(idle):
+                self._idle.put(None)
+        for driver in drivers:
+            self._quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
 class ANAutomator:
 
+    # Creates the event with a browser from the pool, or with a new browser which is quit afterwards if pool is None
     @classmethod
-    def createEvent(self, eventInfo: EventInfo, config: ANAutomatorConfig) -> EventConfirmationInfo:
+    def createEvent(self, eventInfo: EventInfo, config: ANAutomatorConfig, pool: typing.Optional[DriverPool] = None) -> EventConfirmationInfo:
+        if pool is None:
+            with DriverPool(config) as pool:
+                return self.createEvent(eventInfo=eventInfo, config=config, pool=pool)
+
         # AN uses local time for the page
         # We need to convert the incoming time into the local timezone of this machine, and then make it timezone naiive
         localTimezone = tzlocal.get_localzone()
@@ -449,51 +675,29 @@ class ANAutomator:
         eventInfo.startTime = noTzStart
         eventInfo.endTime = noTzEnd
         
-        logging.info("ANAutomator: Starting Driver")
-        options = selenium.webdriver.ChromeOptions()
-        options.add_argument("--headless")
-        driver = selenium.webdriver.Chrome(options)
-        driver.implicitly_wait(2)
-        driver.get(DashboardScreen.Constants.AUSTIN_DSA_DASHBOARD)
+        with pool.driver() as (driver, dashboardScreen):
+            return self._createEventWithDriver(driver=driver, dashboardScreen=dashboardScreen, eventInfo=eventInfo)
 
-        logging.info("ANAutomator: Checking if we need to login")
-        loginScreen = LoginScreen.tryToCreate(driver)
-        if loginScreen is not None:
-            logging.info("ANAutomator: LoginScreen detected, logging in")
-            loginScreen.login(email=config.email, password=config.password)        
-        
-        dashboardScreen = DashboardScreen.tryToCreate(driver)
-        if dashboardScreen is None:
-            logging.error("ANAutomator: Can't find dashboard screen")
-            raise Exception("Not in Dashboard")
-        
+    @classmethod
+    def _createEventWithDriver(self, driver, dashboardScreen: DashboardScreen, eventInfo: EventInfo) -> EventConfirmationInfo:
         logging.info("ANAutomator: Selecting Create Event Item")
         dashboardScreen.selectFromCreateActionMenu(DashboardScreen.ActionsInCreateActionMenu.EVENT)
 
-        editEventScreen = EditEventScreen.tryToCreate(driver)
-        if editEventScreen is None:
-            logging.error("ANAutomator: Can't find edit event screen")
-            raise Exception("Not in edit event screen")
+        editEventScreen = Screen.waitFor(driver, [EditEventScreen])
         logging.info("ANAutomator: Filling out event info")
         editEventScreen.fillOutEventInfo(eventInfo)
 
         logging.info("ANAutomator: Moving to action thank you screen")
         editEventScreen.goToNextStep()
 
-        editEventThankYouScreen = EditEventThankYouScreen.tryToCreate(driver)
-        if editEventThankYouScreen is None:
-            logging.error("ANAutomator: Can't find edit event thank you screen")
-            raise Exception("Not in edit event thank you screen")
+        editEventThankYouScreen = Screen.waitFor(driver, [EditEventThankYouScreen])
         logging.info("ANAutomator: Filling out edit event thank you screen")
         editEventThankYouScreen.addInstructions(eventInfo.insturctions)
 
         logging.info("ANAutomator: Publishing Event")
         editEventThankYouScreen.publishEvent()
 
-        eventConfirmationScreen = EventConfirmationScreen.tryToCreate(driver)
-        if eventConfirmationScreen is None:
-            logging.error("ANAutomator: Can't find event confirmation screen")
-            raise Exception("Not in event confrimation screen")
+        eventConfirmationScreen = Screen.waitFor(driver, [EventConfirmationScreen])
         logging.info("ANAutomator: Getting Event info")
         eventConfirmInfo = EventConfirmationInfo(eventConfirmationScreen.getManagerLink(), eventConfirmationScreen.getDirectLink())
 
@@ -3,11 +3,14 @@ import ActionNetworkAutomation
 import GoogleCalendarAPI
 import datetime
 import logging
+import os
 import ZoomAPI
 import pytz
 import typing
 import dataclasses
 import traceback
+import concurrent.futures
+import contextlib
 
 logging.basicConfig(level=logging.INFO)
 
@@ -73,37 +76,184 @@ class Config:
     gCalConfig : GoogleCalendarAPI.GoogleCalendarConfig
     # This should be used to force a publish after showing the user the potential conflicts
     ignoreResolveableConflicts : bool = False
+    # How many Action Network events publishEvents creates at once, each worker keeps its own browser open
+    anWorkers : int = 2
+
+@dataclasses.dataclass
+class SlotConstraints:
+    # Candidate start times are this far apart, on multiples of step since midnight in timezone
+    step: datetime.timedelta = datetime.timedelta(minutes=15)
+    # Events must start and end within these times of day, in timezone
+    earliestTimeOfDay: datetime.time = datetime.time(hour=9)
+    latestTimeOfDay: datetime.time = datetime.time(hour=21)
+    # Allowed days of the week, Monday is 0
+    weekdays: tuple[int, ...] = (0, 1, 2, 3, 4, 5, 6)
+    # The timezone for the times of day and weekdays, the timezone of the window start if None
+    timezone: typing.Optional[datetime.tzinfo] = None
+    # If set slots closest to this time are ranked first, otherwise the earliest slots are
+    preferredStart: typing.Optional[datetime.datetime] = None
+    # Include slots with Google Calendar conflicts, ranked after slots without any (they are resolveable conflicts)
+    allowGoogleConflicts: bool = False
+    maxResults: int = 10
+
+@dataclasses.dataclass
+class SlotOption:
+    start: datetime.datetime
+    end: datetime.datetime
+    # The most preferred Zoom account free for the whole slot
+    zoomAccount: ZoomAPI.ZoomUser
+    # How many Zoom accounts are free for the whole slot
+    freeZoomAccounts: int
+    # Whether the slot conflicts with the Google Calendar
+    gCalConflict: bool = False
+
+# Sorts and merges intervals of (start, end) which overlap or touch
+def _mergeIntervals(intervals: list[tuple[datetime.datetime, datetime.datetime]]) -> list[tuple[datetime.datetime, datetime.datetime]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# Answers whether a time range overlaps merged busy intervals, for ranges given in increasing order of start so each
+# interval is passed over once
+class _BusySweep:
+    def __init__(self, intervals: list[tuple[datetime.datetime, datetime.datetime]], inclusive: bool) -> None:
+        self._intervals = _mergeIntervals(intervals)
+        # Whether ranges which only touch an interval overlap it
+        self._inclusive = inclusive
+        self._index = 0
+
+    def busy(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        # Skip the intervals ending before start, later ranges start later so they can't overlap those either
+        while self._index < len(self._intervals) and (self._intervals[self._index][1] < start or (not self._inclusive and self._intervals[self._index][1] == start)):
+            self._index += 1
+        if self._index == len(self._intervals):
+            return False
+        intervalStart = self._intervals[self._index][0]
+        return intervalStart <= end if self._inclusive else intervalStart < end
+
+# Finds the times between windowStart and windowEnd where an event of the duration can be published: some Zoom
+# account is free (the same rule as publishEvent) and, unless allowed by the constraints, the Google Calendar is free.
+# The busy intervals of every Zoom account and the Google Calendar are fetched once and every candidate start time is
+# checked by sweeping through them. Returns the best slots first.
+def findSlots(windowStart: datetime.datetime, windowEnd: datetime.datetime, duration: datetime.timedelta, config: Config, constraints: typing.Optional[SlotConstraints] = None) -> list[SlotOption]:
+    if constraints is None:
+        constraints = SlotConstraints()
+    if windowStart.tzinfo is None or windowStart.tzinfo.utcoffset(windowStart) is None:
+        logging.error("EventPublisher: The argument for the windowStart must be timezone aware. Passed in unaware object.")
+        raise Exception("EventPublisher: The argument for the windowStart must be timezone aware. Passed in unaware object.")
+    if windowEnd.tzinfo is None or windowEnd.tzinfo.utcoffset(windowEnd) is None:
+        logging.error("EventPublisher: The argument for the windowEnd must be timezone aware. Passed in unaware object.")
+        raise Exception("EventPublisher: The argument for the windowEnd must be timezone aware. Passed in unaware object.")
+    timezone = constraints.timezone if constraints.timezone is not None else windowStart.tzinfo
+    # Can't schedule in the past
+    windowStart = max(windowStart, datetime.datetime.now(tz=windowStart.tzinfo))
+    # Start on the first step boundary, so the candidates are round times even when the window starts now
+    localWindowStart = windowStart.astimezone(timezone)
+    sinceMidnight = localWindowStart - localWindowStart.replace(hour=0, minute=0, second=0, microsecond=0)
+    windowStart += (constraints.step - sinceMidnight % constraints.step) % constraints.step
+    logging.info("EventPublisher: Finding slots of %s from %s to %s", duration, windowStart, windowEnd)
+
+    # Fetch everything up front
+    zoomApi = ZoomAPI.ZoomAPI(config.zoomConfig)
+    zoomSweeps = [(account, _BusySweep([(m.startTime, m.startTime+m.duration) for m in meetings], inclusive=True))
+                  for (account, meetings) in zoomApi.getMeetingsForAccounts(windowStart, windowEnd)]
+    gCalAPI = GoogleCalendarAPI.GoogleCalendarAPI(config.gCalConfig)
+    runway = GoogleCalendarAPI.Constants.CONFLICT_RUNWAY
+    try:
+        busyCalendar = gCalAPI.getBusyCalendar(windowStart-runway, windowEnd+runway)
+    finally:
+        gCalAPI.close()
+    # Widen the busy intervals by the runway, so they conflict exactly like in findConflicts
+    gCalSweep = _BusySweep([(i.start-runway, i.end+runway) for i in busyCalendar.intervals], inclusive=False)
+
+    slots = []
+    start = windowStart
+    while start+duration <= windowEnd:
+        end = start+duration
+        localStart = start.astimezone(timezone)
+        localEnd = end.astimezone(timezone)
+        if (localStart.weekday() in constraints.weekdays
+                and localStart.date() == localEnd.date()
+                and constraints.earliestTimeOfDay <= localStart.time()
+                and localEnd.time() <= constraints.latestTimeOfDay):
+            gCalConflict = gCalSweep.busy(start, end)
+            freeAccounts = [account for (account, sweep) in zoomSweeps if not sweep.busy(start, end)]
+            if len(freeAccounts) > 0 and (not gCalConflict or constraints.allowGoogleConflicts):
+                slots.append(SlotOption(start=start, end=end, zoomAccount=freeAccounts[0], freeZoomAccounts=len(freeAccounts), gCalConflict=gCalConflict))
+        start += constraints.step
+
+    if constraints.preferredStart is not None:
+        slots.sort(key=lambda slot: (slot.gCalConflict, abs(slot.start-constraints.preferredStart)))
+    else:
+        slots.sort(key=lambda slot: (slot.gCalConflict, slot.start))
+    logging.info("EventPublisher: Found %d slots", len(slots))
+    return slots[:constraints.maxResults]
+
+def _checkEventInfo(eventInfo: EventInfo) -> None:
+    if eventInfo.start.tzinfo is None or eventInfo.start.tzinfo.utcoffset(eventInfo.start) is None:
+        logging.error("EventPublisher: The argument for the eventInfo.start  must be timezone aware. Passed in unaware object.")
+        raise Exception("EventPublisher: The argument for the  eventInfo.start must be timezone aware. Passed in unaware object.")
+    if eventInfo.end.tzinfo is None or eventInfo.end.tzinfo.utcoffset(eventInfo.end) is None:
+        logging.error("EventPublisher: The argument for the eventInfo.end  must be timezone aware. Passed in unaware object.")
+        raise Exception("EventPublisher: The argument for the  eventInfo.end must be timezone aware. Passed in unaware object.")
+    if eventInfo.end < eventInfo.start:
+        logging.error("EventPublisher: eventInfo.end must be after eventInfo.start")
+        raise Exception("EventPublisher: eventInfo.end must be after eventInfo.start")
+
+def _anEventInfo(eventInfo: EventInfo, zoomLink: str) -> ActionNetworkAutomation.EventInfo:
+    return ActionNetworkAutomation.EventInfo(title=eventInfo.title,
+                                             startTime=eventInfo.start,
+                                             endTime=eventInfo.end,
+                                             locationName=eventInfo.locationName,
+                                             address=eventInfo.streetAddress,
+                                             city=eventInfo.city,
+                                             state=eventInfo.state,
+                                             zip=eventInfo.zip,
+                                             description=eventInfo.description,
+                                             country=eventInfo.country,
+                                             insturctions=f"Zoom: {zoomLink} \n\n {eventInfo.instructions}")
+
+def _gCalEvent(eventInfo: EventInfo, anDirectLink: str) -> GoogleCalendarAPI.Event:
+    return GoogleCalendarAPI.Event(title=eventInfo.title,
+                                   start=eventInfo.start,
+                                   end=eventInfo.end,
+                                   description=f"RSVP: {anDirectLink} \n\n {eventInfo.description}",
+                                   location=f"{eventInfo.streetAddress}, {eventInfo.city}, {eventInfo.state} {eventInfo.zip}")
+
+def _unexpected(result: Result, e: Exception) -> Result:
+    result.type = Result.ResultType.UNEXPECTED
+    result.errorStr = traceback.format_exception(e)
+    return result
 
-# TODO: Handle partial results
 def publishEvent(eventInfo: EventInfo, config: Config) -> Result:
     result = Result(type=-1)
+    gCalAPI = None
     try:
         # Guards
-        if eventInfo.start.tzinfo is None or eventInfo.start.tzinfo.utcoffset(eventInfo.start) is None:
-            logging.error("EventPublisher: The argument for the eventInfo.start  must be timezone aware. Passed in unaware object.")
-            raise Exception("EventPublisher: The argument for the  eventInfo.start must be timezone aware. Passed in unaware object.")
-        if eventInfo.end.tzinfo is None or eventInfo.end.tzinfo.utcoffset(eventInfo.end) is None:
-            logging.error("EventPublisher: The argument for the eventInfo.end  must be timezone aware. Passed in unaware object.")
-            raise Exception("EventPublisher: The argument for the  eventInfo.end must be timezone aware. Passed in unaware object.")
-        if eventInfo.end < eventInfo.start:
-            logging.error("EventPublisher: eventInfo.end must be after eventInfo.start")
-            raise Exception("EventPublisher: eventInfo.end must be after eventInfo.start")
+        _checkEventInfo(eventInfo)
         
         # Check for conflicts on Zoom
         zoomApi = ZoomAPI.ZoomAPI(config.zoomConfig)
-        availablility = zoomApi.getAccountsAndAvailablilityForTime(eventInfo.start, eventInfo.end-eventInfo.start)
+        # Accounts are yielded as their meetings are fetched, so stop at the first available one. If none are
+        # available every account has been checked and zoomConflicts has all of the conflicts. Closing the iterator
+        # cancels the fetches for the remaining accounts before going on to Google Calendar and Action Network.
         zoomAccount = None
         zoomConflicts = []
-        for (account, conflicts) in availablility:
-            if len(conflicts) == 0:
-                logging.info("EventPublisher: Found available zoom account %s", account.email)
-                zoomAccount = account
-                break
-            zoomConflicts.extend([Conflict(type=Conflict.ConflictType.ZOOM,
-                                           title=c.topic, 
-                                           start=c.startTime, 
-                                           end=c.startTime+c.duration, 
-                                           zoomUser=account.email) for c in conflicts])
+        with contextlib.closing(zoomApi.iterAccountsAndAvailabilityForTime(eventInfo.start, eventInfo.end-eventInfo.start)) as availablility:
+            for (account, conflicts) in availablility:
+                if len(conflicts) == 0:
+                    logging.info("EventPublisher: Found available zoom account %s", account.email)
+                    zoomAccount = account
+                    break
+                zoomConflicts.extend([Conflict(type=Conflict.ConflictType.ZOOM,
+                                               title=c.topic, 
+                                               start=c.startTime, 
+                                               end=c.startTime+c.duration, 
+                                               zoomUser=account.email) for c in conflicts])
 
         # Check for conflicts on Google
         gCalAPI = GoogleCalendarAPI.GoogleCalendarAPI(config.gCalConfig)
@@ -134,36 +284,166 @@ def publishEvent(eventInfo: EventInfo, config: Config) -> Result:
                                          user=zoomAccount)
         result.zoomLink = zoomLink
         # Schedule Action Network
-        anEventConfirmInfo = ActionNetworkAutomation.ANAutomator.createEvent(eventInfo=ActionNetworkAutomation.EventInfo(title=eventInfo.title,
-                                                                                                                         startTime=eventInfo.start,
-                                                                                                                         endTime=eventInfo.end,
-                                                                                                                         locationName=eventInfo.locationName,
-                                                                                                                         address=eventInfo.streetAddress,
-                                                                                                                         city=eventInfo.city,
-                                                                                                                         state=eventInfo.state,
-                                                                                                                         zip=eventInfo.zip,
-                                                                                                                         description=eventInfo.description,
-                                                                                                                         country=eventInfo.country,
-                                                                                                                         insturctions=f"Zoom: {zoomLink} \n\n {eventInfo.instructions}"
-                                                                                                                         ),
-                                                                                config=config.anConfig)
+        anEventConfirmInfo = ActionNetworkAutomation.ANAutomator.createEvent(eventInfo=_anEventInfo(eventInfo, zoomLink), config=config.anConfig)
         result.anManageLink = anEventConfirmInfo.manageLink
         result.anShareLink = anEventConfirmInfo.directLink
         # Schedule Google Calendar
-        gCalLink = gCalAPI.createEvent(GoogleCalendarAPI.Event(title=eventInfo.title,
-                                                               start=eventInfo.start,
-                                                               end=eventInfo.end,
-                                                               description=f"RSVP: {anEventConfirmInfo.directLink} \n\n {eventInfo.description}",
-                                                               location=f"{eventInfo.streetAddress}, {eventInfo.city}, {eventInfo.state} {eventInfo.zip}"))
+        gCalLink = gCalAPI.createEvent(_gCalEvent(eventInfo, anEventConfirmInfo.directLink))
         result.gCalLink = gCalLink
         result.type = Result.ResultType.PUBLISHED
         return result
 
         # Return Result
     except Exception as e:
-        result.type = Result.ResultType.UNEXPECTED
-        result.errorStr = traceback.format_exception(e)
-        return result
+        return _unexpected(result, e)
+    finally:
+        if gCalAPI is not None:
+            gCalAPI.close()
+
+# Publishes many events, returning a Result for each in the same order. Events which fail or conflict don't stop
+# the others, and the Result of an event which failed part way has the links created before the failure.
+# 1. The Google Calendar conflicts of every event are fetched in batches and the meetings of every Zoom account are
+#    fetched once for all events
+# 2. Each event is checked in order like publishEvent, Zoom first: it is given the first account free both of existing
+#    meetings and of the events given that account before it, so events don't double book, and then checked for
+#    Google Calendar conflicts, including the events accepted before it
+# 3. The Zoom meetings are created concurrently, and each event goes to the pool of config.anWorkers Action Network
+#    browsers as soon as its Zoom meeting exists
+# 4. The calendar entries, which link to the Action Network events, are created in batches
+def publishEvents(eventInfos: list[EventInfo], config: Config) -> list[Result]:
+    results = [Result(type=-1) for _ in eventInfos]
+    # Indices of the events still being published
+    pending = []
+    for i, eventInfo in enumerate(eventInfos):
+        try:
+            _checkEventInfo(eventInfo)
+            if eventInfo.start < datetime.datetime.now(tz=eventInfo.start.tzinfo):
+                logging.error("EventPublisher: Event %s starts in the past at %s", eventInfo.title, eventInfo.start)
+                raise Exception(f"EventPublisher: Event {eventInfo.title} starts in the past at {eventInfo.start}")
+            pending.append(i)
+        except Exception as e:
+            _unexpected(results[i], e)
+    if len(pending) == 0:
+        return results
+
+    try:
+        gCalAPI = GoogleCalendarAPI.GoogleCalendarAPI(config.gCalConfig)
+        zoomApi = ZoomAPI.ZoomAPI(config.zoomConfig)
+    except Exception as e:
+        for i in pending:
+            _unexpected(results[i], e)
+        return results
+
+    try:
+        _publishPendingEvents(eventInfos=eventInfos, pending=pending, results=results, config=config, gCalAPI=gCalAPI, zoomApi=zoomApi)
+    except Exception as e:
+        # The events which were not finished when this happened failed with it
+        for result in results:
+            if result.type == -1:
+                _unexpected(result, e)
+    finally:
+        gCalAPI.close()
+    return results
+
+def _publishPendingEvents(eventInfos: list[EventInfo], pending: list[int], results: list[Result], config: Config, gCalAPI: GoogleCalendarAPI.GoogleCalendarAPI, zoomApi: ZoomAPI.ZoomAPI) -> None:
+    # Fetch the Google Calendar conflicts of every event
+    logging.info("EventPublisher: Checking Google Calendar conflicts for %d events", len(pending))
+    gCalResults = dict(zip(pending, gCalAPI.findConflictsForSlots([(eventInfos[i].start, eventInfos[i].end-eventInfos[i].start) for i in pending])))
+    stillPending = []
+    for i in pending:
+        if not gCalResults[i].valid():
+            _unexpected(results[i], gCalResults[i].error)
+            continue
+        stillPending.append(i)
+    pending = stillPending
+
+    # Check each event like publishEvent, Zoom first since a Zoom conflict is unresolveable. Accounts are reserved for
+    # the events which pass, looking for conflicts within 3 hours of any event like getAccountsAndAvailablilityForTime
+    zoomAccounts = {}
+    if len(pending) > 0:
+        logging.info("EventPublisher: Reserving Zoom accounts for %d events", len(pending))
+        accountMeetings = zoomApi.getMeetingsForAccounts(min(eventInfos[i].start for i in pending)-datetime.timedelta(hours=3),
+                                                         max(eventInfos[i].end for i in pending)+datetime.timedelta(hours=3))
+        # The busy times of each account as Conflicts, including the events reserved in this batch
+        busy = [(account, [Conflict(type=Conflict.ConflictType.ZOOM, title=m.topic, start=m.startTime, end=m.startTime+m.duration, zoomUser=account.email) for m in meetings])
+                for (account, meetings) in accountMeetings]
+        stillPending = []
+        for i in pending:
+            eventInfo = eventInfos[i]
+            zoomAccount = None
+            zoomConflicts = []
+            for account, accountBusy in busy:
+                # Any overlap is a conflict, like in ZoomAPI
+                conflicts = [c for c in accountBusy if not (c.end < eventInfo.start or eventInfo.end < c.start)]
+                if len(conflicts) == 0:
+                    zoomAccount = (account, accountBusy)
+                    break
+                zoomConflicts.extend(conflicts)
+            if zoomAccount is None:
+                logging.error("EventPublisher: Found unresolveable zoom conflicts or no zoom account for %s %s ", eventInfo.title, str(zoomConflicts))
+                results[i].type = Result.ResultType.UNRESOLVEABLE_CONFLICT
+                results[i].conflicts = zoomConflicts
+                continue
+
+            gCalConflicts = [Conflict(type=Conflict.ConflictType.GCAL, title=c.title, start=c.start, end=c.end, zoomUser=None) for c in gCalResults[i].value]
+            # The events accepted earlier in this batch will be on the calendar too
+            windowStart, windowEnd = GoogleCalendarAPI.GoogleCalendarAPI.conflictWindow(eventInfo.start, eventInfo.end-eventInfo.start)
+            gCalConflicts.extend(Conflict(type=Conflict.ConflictType.GCAL, title=eventInfos[j].title, start=eventInfos[j].start, end=eventInfos[j].end, zoomUser=None)
+                                 for j in stillPending if eventInfos[j].start < windowEnd and windowStart < eventInfos[j].end)
+            if len(gCalConflicts) > 0 and not config.ignoreResolveableConflicts:
+                logging.error("EventPublisher: Found gCal conflicts for %s %s ", eventInfo.title, str(gCalConflicts))
+                results[i].type = Result.ResultType.CONFLICT
+                results[i].conflicts = gCalConflicts
+                continue
+
+            account, accountBusy = zoomAccount
+            logging.info("EventPublisher: Reserving zoom account %s for %s", account.email, eventInfo.title)
+            zoomAccounts[i] = account
+            accountBusy.append(Conflict(type=Conflict.ConflictType.ZOOM, title=eventInfo.title, start=eventInfo.start, end=eventInfo.end, zoomUser=account.email))
+            stillPending.append(i)
+        pending = stillPending
+
+    # Schedule Zoom Meetings, each event goes on to Action Network as soon as its meeting is created
+    anInfos = {}
+    def createZoomMeeting(i: int) -> str:
+        eventInfo = eventInfos[i]
+        return zoomApi.createMeeting(title=eventInfo.title, start=eventInfo.start, duration=eventInfo.end-eventInfo.start, user=zoomAccounts[i])
+    def createANEvent(i: int) -> ActionNetworkAutomation.EventConfirmationInfo:
+        return ActionNetworkAutomation.ANAutomator.createEvent(eventInfo=_anEventInfo(eventInfos[i], results[i].zoomLink), config=config.anConfig, pool=driverPool)
+    # Each Action Network worker reuses one logged in browser for its events
+    with ActionNetworkAutomation.DriverPool(config.anConfig, size=config.anWorkers) as driverPool, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=config.zoomConfig.maxConcurrentRequests) as zoomExecutor, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=config.anWorkers) as anExecutor:
+        zoomFutures = {zoomExecutor.submit(createZoomMeeting, i): i for i in pending}
+        anFutures = {}
+        for future in concurrent.futures.as_completed(zoomFutures):
+            i = zoomFutures[future]
+            try:
+                results[i].zoomLink = future.result()
+            except Exception as e:
+                _unexpected(results[i], e)
+                continue
+            anFutures[anExecutor.submit(createANEvent, i)] = i
+        for future in concurrent.futures.as_completed(anFutures):
+            i = anFutures[future]
+            try:
+                anInfos[i] = future.result()
+            except Exception as e:
+                _unexpected(results[i], e)
+                continue
+            results[i].anManageLink = anInfos[i].manageLink
+            results[i].anShareLink = anInfos[i].directLink
+    pending = [i for i in pending if i in anInfos]
+
+    # Schedule Google Calendar
+    if len(pending) > 0:
+        logging.info("EventPublisher: Adding %d events to Google Calendar", len(pending))
+        for i, gCalResult in zip(pending, gCalAPI.createEvents([_gCalEvent(eventInfos[i], anInfos[i].directLink) for i in pending])):
+            if not gCalResult.valid():
+                _unexpected(results[i], gCalResult.error)
+                continue
+            results[i].gCalLink = gCalResult.value
+            results[i].type = Result.ResultType.PUBLISHED
     
 
 
@@ -180,9 +460,11 @@ if __name__ == "__main__":
                       zip="78704",
                       description="A test event",
                       instructions="You don't need to show up")
+    # The Zoom token and account list are reused from the cache file by the next run
     zoomConfig = ZoomAPI.ZoomConfig(accountId="",
                                     clientId="",
-                                    clientSecret="")
+                                    clientSecret="",
+                                    cachePath=os.path.expanduser("~/.zoom_api_cache.json"))
     anConfig = ActionNetworkAutomation.ANAutomatorConfig(email="",
                                                          password="")
     gCalConfig = GoogleCalendarAPI.GoogleCalendarConfig(serviceKeyPath="",
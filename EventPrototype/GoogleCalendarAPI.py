@@ -1,5 +1,6 @@
 
 import datetime
+import bisect
 import google.auth
 import google.auth.transport
 import google.auth.transport.requests
@@ -15,6 +16,19 @@ class Constants:
     SCOPES = ["https://www.googleapis.com/auth/calendar"]
     CALENDAR_SEVRVICE = "calendar"
     CALENDAR_SERVICE_VERSION = "v3"
+    # The most sub-requests Google allows in one batch request
+    BATCH_LIMIT = 50
+    # Time kept free between events, an event conflicts with anything this close to it
+    CONFLICT_RUNWAY = datetime.timedelta(minutes=15)
+    # The most calendars Google allows in one free/busy query
+    FREE_BUSY_CALENDAR_LIMIT = 50
+
+    class FreeBusyKeys:
+        CALENDARS = "calendars"
+        BUSY = "busy"
+        ERRORS = "errors"
+        START = "start"
+        END = "end"
 
     class EventKeys:
         DESCRIPTION = "description"
@@ -84,6 +98,39 @@ class Event:
             d[Constants.EventKeys.LOCATION] = self.location
         return d
 
+# The result of one item of a batch call, either a value or the error for that item
+@dataclasses.dataclass
+class BatchResult:
+    value: typing.Any = None
+    error: typing.Optional[Exception] = None
+
+    def valid(self) -> bool:
+        return self.error is None
+
+@dataclasses.dataclass
+class BusyInterval:
+    calendarId: str
+    start: datetime.datetime
+    end: datetime.datetime
+
+# Busy intervals sorted by start time, so the intervals overlapping a time range can be found by bisection
+class BusyCalendar:
+    def __init__(self, intervals: list[BusyInterval]) -> None:
+        self.intervals = sorted(intervals, key=lambda interval: interval.start)
+        self._starts = [interval.start for interval in self.intervals]
+        # No interval is longer than this, so intervals overlapping a time start at most this long before it
+        self._maxDuration = max((interval.end-interval.start for interval in self.intervals), default=datetime.timedelta(0))
+
+    # Intervals overlapping (start, end), intervals which only touch it do not overlap
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> list[BusyInterval]:
+        first = bisect.bisect_left(self._starts, start - self._maxDuration)
+        last = bisect.bisect_left(self._starts, end)
+        return [interval for interval in self.intervals[first:last] if start < interval.end]
+
+    # Same conflict rule as GoogleCalendarAPI.findConflicts, including the runway around the event
+    def conflicts(self, start: datetime.datetime, duration: datetime.timedelta) -> list[BusyInterval]:
+        return self.overlapping(*GoogleCalendarAPI.conflictWindow(start, duration))
+
 @dataclasses.dataclass
 class GoogleCalendarConfig:
     serviceKeyPath: str
@@ -109,40 +156,140 @@ class GoogleCalendarAPI:
         self.serviceAccountCreds = google.oauth2.service_account.Credentials.from_service_account_file(self.config.serviceKeyPath, scopes=Constants.SCOPES)
         self.delegatedCreds = self.serviceAccountCreds.with_subject(self.config.delegateAccount)
         self.delegatedCreds.refresh(google.auth.transport.requests.Request())
+        # Build the service once and reuse it (and its authorized HTTP connection) for every call. The discovery
+        # document shipped with the client library is used, so nothing is fetched to build it.
+        self.service = googleapiclient.discovery.build(Constants.CALENDAR_SEVRVICE, Constants.CALENDAR_SERVICE_VERSION, credentials=self.delegatedCreds, static_discovery=True, cache_discovery=False)
         # Unclear from docs if we need to refresh these
         # if not self.delegatedCreds or not self.delegatedCreds.valid:
         #     logging.error("GoogleCalendarAPI: Could not create credentials")
         #     raise Exception("GoogleCalendarAPI: Could not create credentials")
 
-    # https://googleapis.github.io/google-api-python-client/docs/dyn/calendar_v3.events.html#list
-    def findConflicts(self, start: datetime.datetime, duration: datetime.timedelta) -> list[Event]:
+    # Returns the time range to look for conflicts with an event starting at start
+    @staticmethod
+    def conflictWindow(start: datetime.datetime, duration: datetime.timedelta) -> tuple[datetime.datetime, datetime.datetime]:
         # Require timezone aware objects 
         if start.tzinfo is None or start.tzinfo.utcoffset(start) is None:
             logging.error("GoogleCalendarAPI: The argument for the start time must be timezone aware. Passed in unaware object.")
             raise Exception("GoogleCalendarAPI: The argument for the start time must be timezone aware. Passed in unaware object.")
         
-        end = start+duration+datetime.timedelta(minutes=15) # Give 15 min runway between events
-        start = start-datetime.timedelta(minutes=15)
+        end = start+duration+Constants.CONFLICT_RUNWAY # Give 15 min runway between events
+        start = start-Constants.CONFLICT_RUNWAY
+        return (start, end)
+
+    # Executes the requests in batches of at most BATCH_LIMIT, returns a (response, exception) tuple for each request
+    # https://googleapis.github.io/google-api-python-client/docs/batch.html
+    def _executeBatch(self, requests: list) -> list[tuple[typing.Optional[dict], typing.Optional[Exception]]]:
+        results = [None] * len(requests)
+        def callback(requestId: str, response: dict, exception: Exception) -> None:
+            results[int(requestId)] = (response, exception)
+        for batchStart in range(0, len(requests), Constants.BATCH_LIMIT):
+            batchEnd = min(batchStart+Constants.BATCH_LIMIT, len(requests))
+            batch = self.service.new_batch_http_request(callback=callback)
+            for i in range(batchStart, batchEnd):
+                batch.add(requests[i], request_id=str(i))
+            logging.info("GoogleCalendarAPI: Sending batch of %d requests", batchEnd-batchStart)
+            batch.execute()
+        return results
+
+    # https://googleapis.github.io/google-api-python-client/docs/dyn/calendar_v3.events.html#list
+    def findConflicts(self, start: datetime.datetime, duration: datetime.timedelta) -> list[Event]:
+        start, end = GoogleCalendarAPI.conflictWindow(start, duration)
         logging.info("GoogleCalendarAPI: Looking for conflicts from %s to %s", str(start), str(end))
-        with googleapiclient.discovery.build(Constants.CALENDAR_SEVRVICE, Constants.CALENDAR_SERVICE_VERSION, credentials=self.delegatedCreds) as service:
-            result = []
-            pageToken = None
-            while True:
-                response = service.events().list(calendarId=self.config.calendarId, timeMin=start.isoformat(), timeMax=end.isoformat(), pageToken=pageToken).execute()
-                for event in response['items']:
-                    result.append(Event.fromApiDict(event))
-                pageToken = response.get('nextPageToken')
-                if not pageToken:
-                    break
-            return result
+        result = []
+        pageToken = None
+        while True:
+            response = self.service.events().list(calendarId=self.config.calendarId, timeMin=start.isoformat(), timeMax=end.isoformat(), pageToken=pageToken).execute()
+            for event in response['items']:
+                result.append(Event.fromApiDict(event))
+            pageToken = response.get('nextPageToken')
+            if not pageToken:
+                break
+        return result
     
     # https://googleapis.github.io/google-api-python-client/docs/dyn/calendar_v3.events.html#insert
     def createEvent(self, event: Event) -> str:
         logging.info("GoogleCalendarAPI: Adding Event %s starting at %s", event.title, str(event.start))
-        with googleapiclient.discovery.build(Constants.CALENDAR_SEVRVICE, Constants.CALENDAR_SERVICE_VERSION, credentials=self.delegatedCreds) as service:
-            body = event.toApiDict()
-            response = service.events().insert(calendarId = self.config.calendarId, body = body).execute()
-            return Event.fromApiDict(response).link
+        body = event.toApiDict()
+        response = self.service.events().insert(calendarId = self.config.calendarId, body = body).execute()
+        return Event.fromApiDict(response).link
+
+    # Same as findConflicts for each (start, duration) slot, with the event lists of all slots requested in batches.
+    # Returns a BatchResult with the list of conflicting events for each slot.
+    def findConflictsForSlots(self, slots: list[tuple[datetime.datetime, datetime.timedelta]]) -> list[BatchResult]:
+        windows = [GoogleCalendarAPI.conflictWindow(start, duration) for (start, duration) in slots]
+        logging.info("GoogleCalendarAPI: Looking for conflicts for %d slots", len(slots))
+        results = [BatchResult(value=[]) for _ in slots]
+        # Slot index and page token of the pages still to be fetched
+        pending = [(i, None) for i in range(len(slots))]
+        while len(pending) > 0:
+            requests = [self.service.events().list(calendarId=self.config.calendarId, timeMin=windows[i][0].isoformat(), timeMax=windows[i][1].isoformat(), pageToken=pageToken) for (i, pageToken) in pending]
+            nextPending = []
+            for (i, _), (response, exception) in zip(pending, self._executeBatch(requests)):
+                if exception is not None:
+                    logging.error("GoogleCalendarAPI: Failed to look for conflicts from %s to %s: %s", str(windows[i][0]), str(windows[i][1]), str(exception))
+                    results[i] = BatchResult(error=exception)
+                    continue
+                results[i].value.extend(Event.fromApiDict(event) for event in response['items'])
+                if response.get('nextPageToken'):
+                    nextPending.append((i, response['nextPageToken']))
+            pending = nextPending
+        return results
+
+    # Same as createEvent for each event, with the events inserted in batches.
+    # Returns a BatchResult with the link of each created event.
+    def createEvents(self, events: list[Event]) -> list[BatchResult]:
+        logging.info("GoogleCalendarAPI: Adding %d events", len(events))
+        requests = [self.service.events().insert(calendarId = self.config.calendarId, body = event.toApiDict()) for event in events]
+        results = []
+        for event, (response, exception) in zip(events, self._executeBatch(requests)):
+            if exception is not None:
+                logging.error("GoogleCalendarAPI: Failed to add event %s: %s", event.title, str(exception))
+                results.append(BatchResult(error=exception))
+            else:
+                results.append(BatchResult(value=Event.fromApiDict(response).link))
+        return results
+
+    # https://developers.google.com/calendar/api/v3/reference/freebusy/query
+    # Returns only the busy intervals of the calendars (by default the configured calendar) between timeMin and timeMax,
+    # without any event details. Many slots can then be checked locally with BusyCalendar.conflicts.
+    def getBusyCalendar(self, timeMin: datetime.datetime, timeMax: datetime.datetime, calendarIds: typing.Optional[list[str]] = None) -> BusyCalendar:
+        if calendarIds is None:
+            calendarIds = [self.config.calendarId]
+        logging.info("GoogleCalendarAPI: Getting busy intervals of %d calendars from %s to %s", len(calendarIds), str(timeMin), str(timeMax))
+        intervals = []
+        for batchStart in range(0, len(calendarIds), Constants.FREE_BUSY_CALENDAR_LIMIT):
+            body = {
+                "timeMin": timeMin.isoformat(),
+                "timeMax": timeMax.isoformat(),
+                "items": [{"id": calendarId} for calendarId in calendarIds[batchStart:batchStart+Constants.FREE_BUSY_CALENDAR_LIMIT]]
+            }
+            response = self.service.freebusy().query(body=body).execute()
+            for calendarId, calendar in response[Constants.FreeBusyKeys.CALENDARS].items():
+                if Constants.FreeBusyKeys.ERRORS in calendar:
+                    logging.error("GoogleCalendarAPI: Could not get busy intervals of calendar %s: %s", calendarId, str(calendar[Constants.FreeBusyKeys.ERRORS]))
+                    raise Exception(f"GoogleCalendarAPI: Could not get busy intervals of calendar {calendarId}: {calendar[Constants.FreeBusyKeys.ERRORS]}")
+                for busy in calendar[Constants.FreeBusyKeys.BUSY]:
+                    intervals.append(BusyInterval(calendarId=calendarId,
+                                                  start=GoogleCalendarAPI._parseTime(busy[Constants.FreeBusyKeys.START]),
+                                                  end=GoogleCalendarAPI._parseTime(busy[Constants.FreeBusyKeys.END])))
+        return BusyCalendar(intervals)
+
+    # Like findConflicts for each (start, duration) slot, but with one free/busy query covering every slot, returning
+    # the busy intervals conflicting with each slot
+    def findBusyConflictsForSlots(self, slots: list[tuple[datetime.datetime, datetime.timedelta]], calendarIds: typing.Optional[list[str]] = None) -> list[list[BusyInterval]]:
+        if len(slots) == 0:
+            return []
+        windows = [GoogleCalendarAPI.conflictWindow(start, duration) for (start, duration) in slots]
+        calendar = self.getBusyCalendar(min(start for start, _ in windows), max(end for _, end in windows), calendarIds)
+        return [calendar.overlapping(start, end) for (start, end) in windows]
+
+    # The API returns UTC times ending in Z, which fromisoformat only accepts from Python 3.11
+    @staticmethod
+    def _parseTime(time: str) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(time.replace("Z", "+00:00"))
+
+    def close(self) -> None:
+        self.service.close()
     
     # def getCalendars(self):
     #     with googleapiclient.discovery.build(Constants.CALENDAR_SEVRVICE, Constants.CALENDAR_SERVICE_VERSION, credentials=self.delegatedCreds) as service:
@@ -1,10 +1,17 @@
 import requests
+import requests.adapters
 import typing
 import dataclasses
+import concurrent.futures
+import threading
 import time
 import datetime
 import logging
 import base64
+import bisect
+import json
+import os
+import tempfile
 import pytz
 import requests.auth
 
@@ -14,6 +21,13 @@ class Constants:
     NEXT_PAGE_TOKEN_KEY = "next_page_token"
     AUTH_HEADER_KEY = "Authorization"
 
+    class DiskCache:
+        ACCOUNT_ID_KEY = "account_id"
+        CLIENT_ID_KEY = "client_id"
+        ACCESS_TOKEN_KEY = "access_token"
+        ACCOUNTS_KEY = "accounts"
+        ACCOUNTS_FETCH_TIME_KEY = "accounts_fetch_time"
+
     class AccessToken:
         OAUTH_ENDPOINT = "https://zoom.us/oauth/token"
         OAUTH_CONTENT_TYPE = "application/x-www-form-urlencoded"
@@ -77,6 +91,9 @@ class Constants:
         CREATE_TYPE = "type"
         CREATE_TOPIC = "topic"
 
+        # How far past the requested window meetings are fetched, so checks for other times nearby hit the cache
+        CACHE_WINDOW = datetime.timedelta(days=7)
+
         
 
 # Mark: Data Classes
@@ -116,11 +133,39 @@ class ZoomMeeting:
     ownerUserId: str
     topic: str
 
+# The meetings of one account in a window of time, sorted by start time so overlapping meetings can be found by bisection
+class MeetingCalendar:
+    def __init__(self, meetings: list[ZoomMeeting], fromDate: datetime.datetime, toDate: datetime.datetime) -> None:
+        self.fromDate = fromDate
+        self.toDate = toDate
+        self.fetchTime = time.monotonic()
+        self._meetings = sorted(meetings, key=lambda meeting: meeting.startTime)
+        self._starts = [meeting.startTime for meeting in self._meetings]
+        # No meeting is longer than this, so meetings overlapping a time start at most this long before it
+        self._maxDuration = max((meeting.duration for meeting in self._meetings), default=datetime.timedelta(0))
+
+    def covers(self, fromDate: datetime.datetime, toDate: datetime.datetime) -> bool:
+        return self.fromDate <= fromDate and toDate <= self.toDate
+
+    # Meetings overlapping [start, end], including meetings which end exactly at start or start exactly at end
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> list[ZoomMeeting]:
+        first = bisect.bisect_left(self._starts, start - self._maxDuration)
+        last = bisect.bisect_right(self._starts, end)
+        return [meeting for meeting in self._meetings[first:last] if start <= meeting.startTime + meeting.duration]
+
 @dataclasses.dataclass
 class ZoomConfig:
     accountId: str
     clientId: str
     clientSecret: str
+    # How many requests to Zoom can be in flight at once, e.g. when fetching the meetings of every account
+    maxConcurrentRequests: int = 8
+    # How long the fetched meetings of an account are used for conflict checks before being fetched again
+    meetingCacheTtl: datetime.timedelta = datetime.timedelta(minutes=5)
+    # If set, the access token and the account list are saved to this file (only readable by the current user) and
+    # reused by later runs, the token until it expires and the accounts for accountCacheTtl. The directory must exist.
+    cachePath: typing.Optional[str] = None
+    accountCacheTtl: datetime.timedelta = datetime.timedelta(days=1)
 
 #TODO: Handle Bad Responses gracefully
 
@@ -131,7 +176,90 @@ class ZoomAPI:
         self._clientId = config.clientId
         self._clientSecret = config.clientSecret
         self._accessToken = None
+        self._accessTokenLock = threading.Lock()
         self._cachedAccounts = None
+        # The MeetingCalendar of each account by account id
+        self._meetingCache = {}
+        self._meetingCacheLock = threading.Lock()
+        self._meetingCacheTtl = config.meetingCacheTtl
+        self._maxConcurrentRequests = config.maxConcurrentRequests
+        # One pooled session shared by every request, so concurrent requests reuse connections
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=config.maxConcurrentRequests)
+        self._session.mount("https://", adapter)
+        self._cachePath = config.cachePath
+        self._accountCacheTtl = config.accountCacheTtl
+        self._cachedAccountsFetchTime = None
+        self._loadDiskCache()
+
+# MARK: Disk Cache
+
+    def _loadDiskCache(self) -> None:
+        if self._cachePath is None or not os.path.exists(self._cachePath):
+            return
+        try:
+            with open(self._cachePath, "r", encoding="utf8") as file:
+                cache = json.load(file)
+            # Don't use a token or accounts cached for a different Zoom account or app
+            if cache.get(Constants.DiskCache.ACCOUNT_ID_KEY) != self._accountId or cache.get(Constants.DiskCache.CLIENT_ID_KEY) != self._clientId:
+                logging.info("ZoomAPI: Disk cache %s is for a different account, ignoring it", self._cachePath)
+                return
+            tokenDict = cache.get(Constants.DiskCache.ACCESS_TOKEN_KEY)
+            if tokenDict is not None:
+                token = AccessToken(token=tokenDict["token"], tokenType=tokenDict["tokenType"], expiresInSec=0, scope=tokenDict["scope"], apiUrl=tokenDict["apiUrl"])
+                token.expireTime = datetime.datetime.fromisoformat(tokenDict["expireTime"])
+                self._accessToken = token
+                if self._isAccessTokenValid():
+                    logging.info("ZoomAPI: Using access token from disk cache. Will expire at %s", str(token.expireTime))
+                else:
+                    self._accessToken = None
+            accounts = cache.get(Constants.DiskCache.ACCOUNTS_KEY)
+            fetchTime = cache.get(Constants.DiskCache.ACCOUNTS_FETCH_TIME_KEY)
+            if accounts is not None and fetchTime is not None:
+                fetchTime = datetime.datetime.fromisoformat(fetchTime)
+                if datetime.datetime.now() - fetchTime < self._accountCacheTtl:
+                    logging.info("ZoomAPI: Using %d accounts from disk cache fetched at %s", len(accounts), str(fetchTime))
+                    self._cachedAccounts = [ZoomUser(email=a["email"], id=a["id"], status=a["status"],
+                                                     features=ZoomUser.Features(**a["features"]) if a["features"] is not None else None)
+                                            for a in accounts]
+                    self._cachedAccountsFetchTime = fetchTime
+        except Exception as e:
+            logging.error("ZoomAPI: Could not read disk cache %s, ignoring it %s", self._cachePath, str(e))
+            self._accessToken = None
+            self._cachedAccounts = None
+            self._cachedAccountsFetchTime = None
+
+    def _saveDiskCache(self) -> None:
+        if self._cachePath is None:
+            return
+        cache = {
+            Constants.DiskCache.ACCOUNT_ID_KEY : self._accountId,
+            Constants.DiskCache.CLIENT_ID_KEY : self._clientId,
+            Constants.DiskCache.ACCESS_TOKEN_KEY : None,
+            Constants.DiskCache.ACCOUNTS_KEY : None,
+            Constants.DiskCache.ACCOUNTS_FETCH_TIME_KEY : None
+        }
+        if self._accessToken is not None:
+            tokenDict = dataclasses.asdict(self._accessToken)
+            tokenDict["expireTime"] = self._accessToken.expireTime.isoformat()
+            cache[Constants.DiskCache.ACCESS_TOKEN_KEY] = tokenDict
+        if self._cachedAccounts is not None:
+            cache[Constants.DiskCache.ACCOUNTS_KEY] = [dataclasses.asdict(account) for account in self._cachedAccounts]
+            cache[Constants.DiskCache.ACCOUNTS_FETCH_TIME_KEY] = self._cachedAccountsFetchTime.isoformat()
+        # Write to a new file only readable by us (mkstemp creates it with mode 0600), since the token gives access to
+        # the account, then replace the old cache. The cache is only an optimization, so failing to save it is logged
+        # and otherwise ignored.
+        tempPath = None
+        try:
+            fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._cachePath)), prefix=f"{os.path.basename(self._cachePath)}.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf8") as file:
+                json.dump(cache, file)
+            os.replace(tempPath, self._cachePath)
+            logging.info("ZoomAPI: Saved disk cache %s", self._cachePath)
+        except OSError as e:
+            logging.error("ZoomAPI: Could not save disk cache %s %s", self._cachePath, str(e))
+            if tempPath is not None and os.path.exists(tempPath):
+                os.remove(tempPath)
 
 # MARK: Utilities
 
@@ -149,7 +277,7 @@ class ZoomAPI:
             Constants.AccessToken.GRANT_TYPE_KEY : Constants.AccessToken.GRANT_TYPE,
             Constants.AccessToken.ACCOUNT_ID_KEY : self._accountId
             }
-        req = requests.post(url=Constants.AccessToken.OAUTH_ENDPOINT, data=body, auth=auth)
+        req = self._session.post(url=Constants.AccessToken.OAUTH_ENDPOINT, data=body, auth=auth)
         req.raise_for_status()
         responseDict = req.json()
         self._accessToken = AccessToken(
@@ -160,6 +288,7 @@ class ZoomAPI:
             apiUrl=responseDict[Constants.AccessToken.RESPONSE_API_URL]
             )
         logging.info("ZoomAPI: Refreshed Access Token. Will expire at %s", str(self._accessToken.expireTime))
+        self._saveDiskCache()
 
 
     # If the token exists and is within its lifetime it is valid
@@ -170,9 +299,11 @@ class ZoomAPI:
     @staticmethod
     def _accessTokenRequired(func):
         def inner(self, *args, **kwargs):
-            if not self._isAccessTokenValid():
-                logging.info("ZoomAPI: Access token invalid")
-                self._refreshAccessToken()
+            # Requests may be made from several threads, only one of them should refresh the token
+            with self._accessTokenLock:
+                if not self._isAccessTokenValid():
+                    logging.info("ZoomAPI: Access token invalid")
+                    self._refreshAccessToken()
             return func(self,*args, **kwargs)
         return inner
 
@@ -180,7 +311,16 @@ class ZoomAPI:
 
     @_accessTokenRequired
     def _fetchAccounts(self) -> list[ZoomUser]:
-        def processJsonResponseIntoUsers(responseDict: dict) -> list[ZoomUser]:
+        def fetchFeatures(user: ZoomUser) -> ZoomUser:
+            logging.info("ZoomAPI: Getting features for user %s", user.email)
+            req = self._session.get(Constants.Users.Features.SETTINGS_ENDPOINT(user.id), headers=self._headersForRequest())
+            req.raise_for_status()
+            responseDict = req.json()
+            user.features = ZoomUser.Features(meetingCapacity=responseDict[Constants.Users.Features.RESPONSE_FEATURE_KEY][Constants.Users.Features.RESPONSE_MEETING_CAPACITY])
+            return user
+
+        # Starts fetching the features of the active users in the response, returns the futures of the users
+        def processJsonResponseIntoUsers(responseDict: dict, executor: concurrent.futures.Executor) -> list[concurrent.futures.Future]:
             if Constants.Users.RESPONSE_USERS_KEY not in responseDict:
                 logging.error("ZoomAPI: No users list in response, returning empty account list")
                 return []
@@ -195,36 +335,37 @@ class ZoomAPI:
                     continue
                 
                 logging.info("ZoomAPI: Found user %s, getting features", newUser.email)
-                req = requests.get(Constants.Users.Features.SETTINGS_ENDPOINT(newUser.id), headers=self._headersForRequest())
-                req.raise_for_status()
-                responseDict = req.json()
-                newUser.features = ZoomUser.Features(meetingCapacity=responseDict[Constants.Users.Features.RESPONSE_FEATURE_KEY][Constants.Users.Features.RESPONSE_MEETING_CAPACITY])
-
-                users.append(newUser)
+                users.append(executor.submit(fetchFeatures, newUser))
             return users
 
         logging.info("ZoomAPI: Fetching accounts")
-        accounts = []
-        req = requests.get(Constants.Users.LIST_USERS_ENDPOINT, headers=self._headersForRequest())
-        req.raise_for_status()
-        responseDict = req.json()
-        accounts.extend(processJsonResponseIntoUsers(responseDict=responseDict))
-        
-        while Constants.NEXT_PAGE_TOKEN_KEY in responseDict and responseDict[Constants.NEXT_PAGE_TOKEN_KEY] != "":
-            logging.info("ZoomAPI: Moving onto next page of account list")
-            params = {Constants.NEXT_PAGE_TOKEN_KEY : responseDict[Constants.NEXT_PAGE_TOKEN_KEY]}
-            req = requests.get(Constants.Users.LIST_USERS_ENDPOINT, headers=self._headersForRequest(), params=params)
+        # The features are fetched concurrently, while the next pages of users are fetched
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._maxConcurrentRequests) as executor:
+            accountFutures = []
+            req = self._session.get(Constants.Users.LIST_USERS_ENDPOINT, headers=self._headersForRequest())
             req.raise_for_status()
             responseDict = req.json()
-            accounts.extend(processJsonResponseIntoUsers(responseDict=responseDict))
-        
-        logging.info("ZoomAPI: No next page, finishing fetching accounts")
+            accountFutures.extend(processJsonResponseIntoUsers(responseDict=responseDict, executor=executor))
+            
+            while Constants.NEXT_PAGE_TOKEN_KEY in responseDict and responseDict[Constants.NEXT_PAGE_TOKEN_KEY] != "":
+                logging.info("ZoomAPI: Moving onto next page of account list")
+                params = {Constants.NEXT_PAGE_TOKEN_KEY : responseDict[Constants.NEXT_PAGE_TOKEN_KEY]}
+                req = self._session.get(Constants.Users.LIST_USERS_ENDPOINT, headers=self._headersForRequest(), params=params)
+                req.raise_for_status()
+                responseDict = req.json()
+                accountFutures.extend(processJsonResponseIntoUsers(responseDict=responseDict, executor=executor))
+            
+            logging.info("ZoomAPI: No next page, waiting for account features")
+            accounts = [future.result() for future in accountFutures]
+        logging.info("ZoomAPI: Finished fetching accounts")
         return accounts
 
     def _accounts(self) -> list[ZoomUser]:
         if self._cachedAccounts is None:
             logging.info("ZoomAPI: No accounts in cache")
             self._cachedAccounts = self._fetchAccounts()
+            self._cachedAccountsFetchTime = datetime.datetime.now()
+            self._saveDiskCache()
         else:
             logging.info("ZoomAPI: Returning Cached ids")
         return self._cachedAccounts
@@ -264,7 +405,7 @@ class ZoomAPI:
                    Constants.Meetings.QUERY_PARAM_TO_DATE : toDate.isoformat(),
                    Constants.Meetings.QUERY_PARAM_TIMEZONE : fromDate.tzinfo.tzname(fromDate),
                    Constants.Meetings.QUERY_PARAM_TYPE : Constants.Meetings.QUERY_PARAM_TYPE_UPCOMING}
-        req = requests.get(Constants.Meetings.MEETING_ENDPOINT(account.id), headers=self._headersForRequest(), params=params)
+        req = self._session.get(Constants.Meetings.MEETING_ENDPOINT(account.id), headers=self._headersForRequest(), params=params)
         req.raise_for_status()
         responseDict = req.json()
         meetings.extend(processJsonResponIntoMeetings(responseDict=responseDict))
@@ -272,7 +413,7 @@ class ZoomAPI:
         while Constants.NEXT_PAGE_TOKEN_KEY in responseDict and responseDict[Constants.NEXT_PAGE_TOKEN_KEY] != "":
             logging.info("ZoomAPI: Moving onto next page of meeting list")
             params[Constants.NEXT_PAGE_TOKEN_KEY] = responseDict[Constants.NEXT_PAGE_TOKEN_KEY]
-            req = requests.get(Constants.Meetings.MEETING_ENDPOINT(account.id), headers=self._headersForRequest(), params=params)
+            req = self._session.get(Constants.Meetings.MEETING_ENDPOINT(account.id), headers=self._headersForRequest(), params=params)
             req.raise_for_status()
             responseDict = req.json()
             meetings.extend(processJsonResponIntoMeetings(responseDict=responseDict))
@@ -287,6 +428,19 @@ class ZoomAPI:
     # 0 - The account this record is for
     # 1 - List of conflicting meetings, if empty then account is available
     def getAccountsAndAvailablilityForTime(self, time: datetime.datetime, duration: datetime.timedelta) -> list[tuple[ZoomUser,list[ZoomMeeting]]]:
+        return list(self.iterAccountsAndAvailabilityForTime(time=time, duration=duration))
+
+    # Preferences for iterAccountsAndAvailabilityForTime, the accounts are yielded in increasing order of the preference
+    @staticmethod
+    def preferLargestCapacity(account: ZoomUser) -> int:
+        return -account.features.meetingCapacity if account.features is not None else 0
+
+    # Yields the same tuples as getAccountsAndAvailablilityForTime, ordered by preference (a sort key for the accounts,
+    # by default the order Zoom lists them in). The meetings of every account are fetched concurrently and each account
+    # is yielded as soon as it and the accounts before it are resolved, so a caller looking for the first available
+    # account can stop early. Fetches which have not started are cancelled when the caller closes the iterator, so
+    # callers stopping early should close it (e.g. with contextlib.closing).
+    def iterAccountsAndAvailabilityForTime(self, time: datetime.datetime, duration: datetime.timedelta, preference: typing.Optional[typing.Callable[[ZoomUser], typing.Any]] = None) -> typing.Iterator[tuple[ZoomUser,list[ZoomMeeting]]]:
         # Require timezone aware objects 
         if time.tzinfo is None or time.tzinfo.utcoffset(time) is None:
             logging.error("ZoomAPI: The argument for the start time must be timezone aware. Passed in unaware object.")
@@ -301,26 +455,68 @@ class ZoomAPI:
         logging.info("ZoomAPI: Check availability for meeting starting at %s for duration %s", time, duration)
         fromDate = time - datetime.timedelta(hours=3)
         toDate = time + datetime.timedelta(hours=3)+duration
-        results = []
-        for account in self._accounts():
-            # Get potential conflicts
-            potentialConflicts = self._fetchMeetingsForAccountAndTime(account=account, fromDate=fromDate, toDate=toDate)
-            confirmedConflicts = []
-            # Check for conflicts
-            logging.info("ZoomAPI: Checking conflicts for account %s", account.email)
-            for potentialConflict in potentialConflicts:
-                # If the potential conflict ends before the meeting starts then there is no conflict
-                if potentialConflict.startTime+potentialConflict.duration < time:
-                    continue
-                # If the potential conflict starts after the meeting ends then there is no conflict
-                if time+duration < potentialConflict.startTime:
-                    continue
-                # Otherwise there must be overlap and so we have a conflict
-                logging.info("ZoomAPI: Found conflict by meeting %s at %s for %s duration", potentialConflict.topic, potentialConflict.startTime, potentialConflict.duration)
-                confirmedConflicts.append(potentialConflict)
-            results.append((account,confirmedConflicts))
-        logging.info("ZoomAPI: Done checking availability")
-        return results
+        accounts = self._accounts()
+        if preference is not None:
+            accounts = sorted(accounts, key=preference)
+        # Validate before returning the generator, so bad arguments raise immediately
+        return self._iterConflicts(accounts=accounts, time=time, duration=duration, fromDate=fromDate, toDate=toDate)
+
+    def _iterConflicts(self, accounts: list[ZoomUser], time: datetime.datetime, duration: datetime.timedelta, fromDate: datetime.datetime, toDate: datetime.datetime) -> typing.Iterator[tuple[ZoomUser,list[ZoomMeeting]]]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._maxConcurrentRequests)
+        try:
+            # Submitted in order, so the pool works on the preferred accounts first
+            futures = [(account, executor.submit(self._conflictsForAccount, account=account, time=time, duration=duration, fromDate=fromDate, toDate=toDate)) for account in accounts]
+            for account, future in futures:
+                yield (account, future.result())
+            logging.info("ZoomAPI: Done checking availability")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _conflictsForAccount(self, account: ZoomUser, time: datetime.datetime, duration: datetime.timedelta, fromDate: datetime.datetime, toDate: datetime.datetime) -> list[ZoomMeeting]:
+        calendar = self._meetingCalendar(account=account, fromDate=fromDate, toDate=toDate)
+        # Check for conflicts, any overlap is a conflict
+        logging.info("ZoomAPI: Checking conflicts for account %s", account.email)
+        confirmedConflicts = calendar.overlapping(time, time+duration)
+        for conflict in confirmedConflicts:
+            logging.info("ZoomAPI: Found conflict by meeting %s at %s for %s duration", conflict.topic, conflict.startTime, conflict.duration)
+        return confirmedConflicts
+
+    # Returns the cached meetings of the account if they cover the window and are not older than the TTL, otherwise
+    # fetches the meetings for the window extended by CACHE_WINDOW and caches them
+    def _meetingCalendar(self, account: ZoomUser, fromDate: datetime.datetime, toDate: datetime.datetime) -> MeetingCalendar:
+        with self._meetingCacheLock:
+            calendar = self._meetingCache.get(account.id)
+        if calendar is not None and calendar.covers(fromDate, toDate) and time.monotonic() - calendar.fetchTime < self._meetingCacheTtl.total_seconds():
+            logging.info("ZoomAPI: Using cached meetings for %s", account.email)
+            return calendar
+        toDate = max(toDate, fromDate + Constants.Meetings.CACHE_WINDOW)
+        calendar = MeetingCalendar(meetings=self._fetchMeetingsForAccountAndTime(account=account, fromDate=fromDate, toDate=toDate), fromDate=fromDate, toDate=toDate)
+        with self._meetingCacheLock:
+            self._meetingCache[account.id] = calendar
+        return calendar
+
+    # Returns the meetings of every account (in preference order, see iterAccountsAndAvailabilityForTime) overlapping
+    # fromDate to toDate, fetched concurrently and cached like the meetings used for conflict checks
+    def getMeetingsForAccounts(self, fromDate: datetime.datetime, toDate: datetime.datetime, preference: typing.Optional[typing.Callable[[ZoomUser], typing.Any]] = None) -> list[tuple[ZoomUser,list[ZoomMeeting]]]:
+        if fromDate.tzinfo is None or fromDate.tzinfo.utcoffset(fromDate) is None:
+            logging.error("ZoomAPI: The argument for the start time must be timezone aware. Passed in unaware object.")
+            raise Exception("ZoomAPI: The argument for the start time must be timezone aware. Passed in unaware object.")
+        accounts = self._accounts()
+        if preference is not None:
+            accounts = sorted(accounts, key=preference)
+        def meetings(account: ZoomUser) -> tuple[ZoomUser,list[ZoomMeeting]]:
+            calendar = self._meetingCalendar(account=account, fromDate=fromDate, toDate=toDate)
+            return (account, calendar.overlapping(fromDate, toDate))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._maxConcurrentRequests) as executor:
+            return list(executor.map(meetings, accounts))
+
+    # Drops the cached meetings of the account, or of every account if account is None, so they are fetched again
+    def invalidateMeetingCache(self, account: typing.Optional[ZoomUser] = None) -> None:
+        with self._meetingCacheLock:
+            if account is None:
+                self._meetingCache.clear()
+            else:
+                self._meetingCache.pop(account.id, None)
     
     @_accessTokenRequired
     def createMeeting(self, title: str, start: datetime.datetime, duration: datetime.timedelta, user: ZoomUser) -> str:
@@ -330,7 +526,7 @@ class ZoomAPI:
         logging.info("ZoomAPI: Creating meeting %s at %s that lasts %s for user %s", title, str(time), str(duration), user.email)
         # headers = self._headersForRequest()
         # headers[Content-Type: application/json]
-        req = requests.post(Constants.Meetings.MEETING_ENDPOINT(user.id), headers=self._headersForRequest(), json={
+        req = self._session.post(Constants.Meetings.MEETING_ENDPOINT(user.id), headers=self._headersForRequest(), json={
             Constants.Meetings.CREATE_TOPIC : title,
             Constants.Meetings.CREATE_START_TIME : start.isoformat(),
             Constants.Meetings.CREATE_START_TIMEZONE : start.tzinfo.tzname(start),
@@ -338,6 +534,8 @@ class ZoomAPI:
             Constants.Meetings.CREATE_TYPE : Constants.Meetings.TYPE_SCHEDULED
         })
         req.raise_for_status()
+        # The new meeting is not in the cached meetings of the account
+        self.invalidateMeetingCache(user)
         logging.info("ZoomAPI: Created meeting")
         return req.json()[Constants.Meetings.RESPONSE_JOIN_URL_KEY]
 
@@ -0,0 +1,49 @@
+"""
+Checks that DriverPool quits borrowed drivers on close instead of waiting for them, with fake drivers so no browser is
+started.
+
+    python -m pytest EventPrototype/test_ActionNetworkAutomation.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ActionNetworkAutomation
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quitCount = 0
+
+    def quit(self):
+        self.quitCount += 1
+
+
+def fakePool(size: int) -> ActionNetworkAutomation.DriverPool:
+    pool = ActionNetworkAutomation.DriverPool(config=None, size=size)
+    pool.started = []
+
+    def startDriver():
+        driver = FakeDriver()
+        pool.started.append(driver)
+        return driver
+
+    pool._startDriver = startDriver
+    pool._openDashboard = lambda driver: None
+    return pool
+
+
+def test_close_quits_borrowed_drivers():
+    pool = fakePool(size=2)
+    with pool.driver():
+        pass
+    with pool.driver() as (borrowed, _):
+        pool.close()
+        assert borrowed.quitCount == 1
+    # Returning the closed driver quits it again rather than putting it back in the pool
+    with pool.driver() as (driver, _), pool.driver() as (other, _):
+        assert borrowed not in (driver, other)
+    pool.close()
+    assert all(driver.quitCount >= 1 for driver in pool.started)
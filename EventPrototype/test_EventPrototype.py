@@ -0,0 +1,78 @@
+"""
+Checks that publishEvent and publishEvents classify conflicts the same way, with Zoom and Google Calendar replaced by
+fakes so nothing is created.
+
+    python -m pytest EventPrototype/test_EventPrototype.py
+"""
+
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import EventPrototype
+import GoogleCalendarAPI
+import ZoomAPI
+
+START = datetime.datetime.now(tz=datetime.timezone.utc).replace(microsecond=0) + datetime.timedelta(days=7)
+END = START + datetime.timedelta(hours=1)
+
+ACCOUNT = ZoomAPI.ZoomUser(email="zoom@example.org", id="zoom", status="active")
+MEETING = ZoomAPI.ZoomMeeting(id="1", startTime=START, duration=END - START, joinUrl="", ownerUserId="zoom", topic="Zoom meeting")
+CALENDAR_EVENT = GoogleCalendarAPI.Event(title="Calendar event", start=START, end=END, description="", location=None)
+
+
+class FakeZoomAPI:
+    """The only account is busy for the whole event."""
+
+    def __init__(self, config):
+        pass
+
+    def iterAccountsAndAvailabilityForTime(self, time, duration):
+        yield (ACCOUNT, [MEETING])
+
+    def getMeetingsForAccounts(self, fromDate, toDate):
+        return [(ACCOUNT, [MEETING])]
+
+    def createMeeting(self, title, start, duration, user):
+        raise AssertionError("No meeting should be created")
+
+
+class FakeGoogleCalendarAPI:
+    """The calendar has an event at the same time as the published event."""
+
+    def __init__(self, config):
+        pass
+
+    def findConflicts(self, start, duration):
+        return [CALENDAR_EVENT]
+
+    def findConflictsForSlots(self, slots):
+        return [GoogleCalendarAPI.BatchResult(value=[CALENDAR_EVENT]) for _ in slots]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setattr(ZoomAPI, "ZoomAPI", FakeZoomAPI)
+    monkeypatch.setattr(GoogleCalendarAPI, "GoogleCalendarAPI", FakeGoogleCalendarAPI)
+    return EventPrototype.Config(zoomConfig=ZoomAPI.ZoomConfig(accountId="", clientId="", clientSecret=""),
+                                 anConfig=None,
+                                 gCalConfig=None)
+
+
+def test_zoom_and_calendar_conflicts_are_unresolveable(config):
+    eventInfo = EventPrototype.EventInfo(title="Event", start=START, end=END, locationName="", streetAddress="",
+                                         city="Austin", state="TX", zip="78701", description="")
+
+    single = EventPrototype.publishEvent(eventInfo, config)
+    [batch] = EventPrototype.publishEvents([eventInfo], config)
+
+    assert single.type == EventPrototype.Result.ResultType.UNRESOLVEABLE_CONFLICT
+    assert batch.type == single.type
+    assert [c.title for c in batch.conflicts] == [c.title for c in single.conflicts] == ["Zoom meeting"]
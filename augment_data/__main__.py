@@ -1,9 +1,12 @@
-from dataclasses import asdict
+import asyncio
+from dataclasses import fields
 import logging
-import os
+import sys
 import time
-from typing import List
-from . import geocodio_api, austin_city_api, datasource
+from typing import List, Optional, Tuple
+from . import address, metrics
+from .cli import add_source_arguments, assemble_address, build_sources, chunks
+from .resolver import Resolver
 from pathlib import Path
 import argparse
 import csv
@@ -11,21 +14,22 @@ import csv
 logger = logging.getLogger(__name__)
 
 
-def read_csv(filename: Path):
+def read_completed_rows(filename: Path) -> Tuple[List[str], List[dict]]:
+    """
+    Read the header and the rows already written to a partial output file. If the file ends in an incomplete line
+    (because the previous run was interrupted while writing it) that line is removed from the file.
+    """
+    with open(filename, "rb+") as file:
+        content = file.read()
+        if content and not content.endswith(b"\n"):
+            logger.warning(f"Removing incomplete last line from {filename}")
+            file.truncate(content.rfind(b"\n") + 1)
     with open(filename, "r", newline="", encoding="utf8") as file:
         reader = csv.DictReader(file)
-        return list(reader)
+        return list(reader.fieldnames or []), list(reader)
 
 
-def assemble_address(row: dict) -> str:
-    """Take a row dict and assemble an address from the fields address1, address2, city, state, zip, country."""
-    return (
-        f"{row.get('address1', '')} {row.get('address2', '')}, {row.get('city', '')},"
-        f" {row.get('state', '')}, {row.get('zip', '')}, {row.get('country', '')}"
-    )
-
-
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(
         description="""                                     
 This script goes through the input CSV file which should be formatted as an Action Network membership list and adds 
@@ -51,54 +55,143 @@ webserver. Make sure you do not run this script on larger data sets without good
         "throttling by accident. You will want to decrease this probably. (default: 30 seconds)",
     )
     parser.add_argument(
-        "--geocodio",
+        "--async",
+        dest="use_async",
         action="store_true",
-        help="Use Geocodio to get state and federal districts.",
+        help="Query sources with asyncio, keeping up to --city-in-flight Austin City lookups in flight. Each chunk of --batch-size rows is resolved at once, sources of the same cost at the same time, and --interval is not applied.",
     )
     parser.add_argument(
-        "--city",
+        "--resume",
         action="store_true",
-        help="Use the Austin City website to get city council districts",
+        help="Continue a previous interrupted run. Rows already in the output file are kept and not processed again.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="The number of rows sent to sources which support batching (like Geocodio) at a time. Each row is "
+        "written to the output as soon as it is complete. (default: 1000)",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="Write a JSON summary of the run (per source call counts, hit rates, latency percentiles, cache hits and "
+        "HTTP status classes) to this path.",
     )
     parser.add_argument(
-        "--geocodio-key",
-        type=str,
-        default=os.environ.get("GEOCODIO_KEY"),
-        help="A Geocodio API key. You can also put the key in the environment variable GEOCODIO_KEY.",
+        "--progress",
+        action="store_true",
+        help="Show a live progress line with the number of rows done, the throughput and an ETA.",
     )
-    parser.add_argument("--min-proportion", type=float, default=0.5)
+    add_source_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
 
-    logger.info(f"Data loaded from {args.input}")
-    data = read_csv(args.input)
-
-    sources: List[datasource.AddressAugmentationDatasource] = []
-    if args.city:
-        sources.append(austin_city_api.AustinCityDatasource())
-    if args.geocodio:
-        sources.append(geocodio_api.GeocodioDatasource(key=args.geocodio_key, min_proportion=args.min_proportion))
-    
-    for row in data:
-        address = assemble_address(row)
-        logger.info(
-            f"Processing row: name: {row.get('first_name')} {row.get('last_name')} address: {address}"
-        )
-        for source in sources:
-            res = source.query(address)
-            logger.info(f"{type(source).__name__}: {res}")
-            row.update(asdict(res))
-        time.sleep(args.interval)
+    sources, result_cache = build_sources(args)
 
-    with open(args.output, "w", newline="", encoding="utf8") as file:
-        fieldnames = data[0].keys()
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
+    total_rows = None
+    if args.progress:
+        with open(args.input, "r", newline="", encoding="utf8") as input_file:
+            total_rows = sum(1 for _ in csv.DictReader(input_file))
+    run_metrics = metrics.Metrics(total_rows=total_rows)
+    sources = [run_metrics.instrument(source) for source in sources]
 
+    resolver = Resolver(sources)
+
+    with open(args.input, "r", newline="", encoding="utf8") as input_file:
+        reader = csv.DictReader(input_file)
+        logger.info(f"Data loaded from {args.input}")
+        fieldnames = list(reader.fieldnames or [])
+        for source in sources:
+            fieldnames.extend(f.name for f in fields(source.result_type) if f.name not in fieldnames)
+
+        completed = []
+        if args.resume and args.output.exists():
+            header, completed = read_completed_rows(args.output)
+            # The rows are appended with the current columns, so they have to be the columns of the existing output
+            if header and header != fieldnames:
+                raise Exception(
+                    f"The columns of the existing output {args.output} do not match the columns for the input "
+                    f"{args.input} and the selected sources. Cannot resume."
+                )
+            logger.info(f"Resuming after {len(completed)} rows already in {args.output}")
+            if run_metrics.total_rows is not None:
+                run_metrics.total_rows -= len(completed)
+        rows = iter(reader)
+        # Rows are written in input order, so the completed rows are the first rows of the input
+        for done, row in zip(completed, rows):
+            if any(done.get(key) != value for key, value in row.items()):
+                raise Exception(
+                    f"Existing output {args.output} does not match the input {args.input}. Cannot resume."
+                )
+
+        with open(args.output, "a" if completed else "w", newline="", encoding="utf8") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=fieldnames)
+            if not completed:
+                writer.writeheader()
+
+            def resolve_chunk(chunk: List[dict]):
+                addresses = [assemble_address(row) for row in chunk]
+                keys = [address.canonicalize_address(a) for a in addresses]
+                resolver.resolve_batch(keys, addresses)
+                return chunk, addresses, keys
+
+            async def aresolve_chunk(chunk: List[dict]):
+                addresses = [assemble_address(row) for row in chunk]
+                keys = [address.canonicalize_address(a) for a in addresses]
+                await resolver.aresolve(keys, addresses)
+                # Only queries the addresses an error left unresolved
+                resolver.resolve_batch(keys, addresses)
+                return chunk, addresses, keys
+
+            def write_chunk(chunk: List[dict], addresses: List[str], keys: List[str]):
+                for row, a, key in zip(chunk, addresses, keys):
+                    logger.info(f"Processing row: name: {row.get('first_name')} {row.get('last_name')} address: {a}")
+                    queried = resolver.resolve_row(key, a)
+                    row.update(resolver.fields(key))
+                    writer.writerow(row)
+                    output_file.flush()
+                    run_metrics.row_done()
+                    if args.progress:
+                        run_metrics.print_progress()
+                    if queried and not args.use_async:
+                        time.sleep(args.interval)
+
+            async def augment_async():
+                # One event loop for the whole run, so the sources keep their connections open between chunks. The
+                # next chunk is already being resolved while the current one is finished and written, so the lookups
+                # don't wait for the slowest lookup of every chunk.
+                pending: List[asyncio.Task] = []
+                try:
+                    for chunk in chunks(rows, args.batch_size):
+                        pending.append(asyncio.create_task(aresolve_chunk(chunk)))
+                        if len(pending) > 1:
+                            write_chunk(*await pending.pop(0))
+                    while pending:
+                        write_chunk(*await pending.pop(0))
+                finally:
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    await asyncio.gather(*(source.aclose() for source in sources))
+
+            if args.use_async:
+                asyncio.run(augment_async())
+            else:
+                for chunk in chunks(rows, args.batch_size):
+                    write_chunk(*resolve_chunk(chunk))
+
+    if args.progress:
+        print(file=sys.stderr)
     logger.info(f"Augmented data written to {args.output}")
+    logger.info(f"Metrics: {run_metrics.summary()}")
+    if args.metrics:
+        run_metrics.write_summary(args.metrics)
+
+    if result_cache is not None:
+        result_cache.close()
 
 
 
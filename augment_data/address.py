@@ -0,0 +1,61 @@
+"""
+Canonicalization of addresses so that different spellings of the same address (as typed by members sharing a
+household, for example) can be recognized as the same and only queried once.
+"""
+
+import re
+
+# Common spellings mapped to their USPS abbreviation
+ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "av": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "circle": "cir",
+    "place": "pl",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "terrace": "ter",
+    "trail": "trl",
+    "cove": "cv",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "northeast": "ne",
+    "northwest": "nw",
+    "southeast": "se",
+    "southwest": "sw",
+    "texas": "tx",
+    "usa": "us",
+}
+
+# Words introducing a unit number, which are all treated like "#"
+UNIT_DESIGNATORS = {"apartment", "apt", "unit", "suite", "ste", "no", "number"}
+
+
+def canonicalize_address(address: str) -> str:
+    """
+    Return a canonical form of an address, ignoring case, punctuation, repeated whitespace, empty fields,
+    common abbreviations, a US country and how the unit number is introduced ("Apt 5", "Unit 5" and "#5" are the
+    same).
+    """
+    address = address.lower().replace("#", " # ").replace("united states", "us")
+    address = re.sub(r"[^\w\s#]", " ", address)
+    words = []
+    for word in address.split():
+        if word in UNIT_DESIGNATORS:
+            word = "#"
+        word = ABBREVIATIONS.get(word, word)
+        # Collapse "apt #" and similar into a single "#"
+        if word == "#" and words and words[-1] == "#":
+            continue
+        words.append(word)
+    # Members are all in the US, so a trailing US country is the same as an empty country
+    if words and words[-1] == "us":
+        words.pop()
+    return " ".join(words)
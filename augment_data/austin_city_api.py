@@ -5,17 +5,26 @@ An interface to the Austin City Council website as an API to retrieve council di
 webserver. Make sure you do not run this script on larger data sets without good reason and without checking your arguments and inputs.
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-import json
 import logging
-from typing import Optional
+from typing import Any, List, Optional, Tuple
 
+import httpx
 import requests
+import requests.adapters
 
 from augment_data.datasource import AddressAugmentationDatasource
+from augment_data.districts import DistrictIndex
 
 logger = logging.getLogger(__name__)
 
+MAPS_URL = "https://maps.austintexas.gov"
+WEBSITE_URL = "https://www.austintexas.gov"
+GEOCODE_PATH = "/arcgis/rest/services/Geocode/COA_Locator/GeocodeServer/findAddressCandidates"
+COUNCIL_DISTRICT_PATH = "/gis/rest/Shared/CouncilDistrictsFill/MapServer/0/query"
+
 
 @dataclass(repr=True)
 class Location:
@@ -58,34 +67,58 @@ class AustinCityResult:
 
 
 class AustinCityDatasource(AddressAugmentationDatasource):
-    def __init__(self):
+    result_type = AustinCityResult
+
+    # Each address needs a geocode and a district request to the city's server
+    cost = 2
+
+    # Accuracy types of results from other sources whose point is trusted enough to skip our own geocoding
+    trusted_accuracy_types = ["rooftop"]
+
+    def __init__(
+        self,
+        *,
+        council_districts: Optional[DistrictIndex] = None,
+        max_in_flight: int = 1,
+        base_url: Optional[str] = None,
+    ):
+        """
+        If `council_districts` is provided, council districts are looked up locally in that index instead of
+        querying the city's server. The index must use WGS84 longitude/latitude coordinates, as GeoJSON does.
+
+        `max_in_flight` is the number of addresses query_batch and aquery_batch work on at once. With more than one,
+        the geocode request for one address overlaps with the district request for another on the shared session.
+
+        `base_url` replaces both the maps and website servers of the city, for example to use a replay server.
+        """
+        self.council_districts = council_districts
+        self._geocode_url = (base_url or MAPS_URL) + GEOCODE_PATH
+        self._council_district_url = (base_url or MAPS_URL) + COUNCIL_DISTRICT_PATH
+        self.max_in_flight = max_in_flight
+        self.supports_batch = max_in_flight > 1
         self.session = requests.Session()
-        self.session.get("https://www.austintexas.gov/government")
+        self._aclients: Optional[List[httpx.AsyncClient]] = None
+        self._asemaphore: Optional[asyncio.Semaphore] = None
+        # Keep a pooled connection per address in flight so they are not reopened for every request
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.hooks["response"].append(lambda response, *args, **kwargs: self._record_http_response(response.status_code))
+        self.session.get((base_url or WEBSITE_URL) + "/government")
 
-    def geocode_address(self, address: str) -> Optional[GeocodedAddress]:
-        url = "https://maps.austintexas.gov/arcgis/rest/services/Geocode/COA_Locator/GeocodeServer/findAddressCandidates"
-        params = {
+    def _geocode_params(self, address: str) -> dict:
+        return {
             "outFields": "",
             "maxLocations": 1,
-            "outSR": "",
+            # Request WGS84 coordinates when they will be looked up in the local (GeoJSON) district index
+            "outSR": "4326" if self.council_districts else "",
             "searchExtent": "",
-            "f": "pjson",
+            "f": "json",
             "SingleLine": address,
-            "callback": "callback",
-            "js": 1,
         }
-        response = self.session.get(url, params=params)
-
-        # Check that the response uses the callback callback function
-        if not response.text.startswith("callback("):
-            logger.warning(
-                f"Received JSONP response with callback name {response.text[:10]}.. which is not expected."
-            )
-
-        # Extract JSON from JSONP response
-        json_str = response.text[response.text.index("(") + 1 : -2]
-        data = json.loads(json_str)
 
+    @staticmethod
+    def _parse_geocode_response(address: str, data: dict) -> Optional[GeocodedAddress]:
         if data["candidates"]:
             candidate = data["candidates"][0]
             return GeocodedAddress(
@@ -98,8 +131,8 @@ class AustinCityDatasource(AddressAugmentationDatasource):
             logger.info(f"No geocoded address found for {address}")
         return None
 
-    def get_council_district(self, location: Location) -> Optional[int]:
-        url = "https://maps.austintexas.gov/gis/rest/Shared/CouncilDistrictsFill/MapServer/0/query"
+    @staticmethod
+    def _district_params(location: Location, wgs84: bool) -> dict:
         params = {
             "geometryType": "esriGeometryPoint",
             "spatialRel": "esriSpatialRelIntersects",
@@ -108,14 +141,50 @@ class AustinCityDatasource(AddressAugmentationDatasource):
             "f": "pjson",
             "geometry": f"{location.x},{location.y}",
         }
-        response = self.session.get(url, params=params)
-        data = response.json()
+        if wgs84:
+            params["inSR"] = "4326"
+        return params
+
+    @staticmethod
+    def _known_location(known: List[Any]) -> Optional[Tuple[str, Location]]:
+        """
+        Find a trusted point among the results of other sources, as the cleaned address and a WGS84 location.
+        Any result with latitude, longitude and accuracy_type fields (like GeocodioResult) can provide one.
+        """
+        for res in known:
+            if (
+                getattr(res, "accuracy_type", None) in AustinCityDatasource.trusted_accuracy_types
+                and getattr(res, "latitude", None) is not None
+                and getattr(res, "longitude", None) is not None
+            ):
+                return res.cleaned_address, Location(x=res.longitude, y=res.latitude)
+        return None
 
+    @staticmethod
+    def _parse_district_response(data: dict) -> Optional[int]:
         if data["features"]:
             district = data["features"][0]["attributes"]["COUNCIL_DISTRICT"]
             return int(district)
         return None
 
+    def _local_council_district(self, location: Location) -> Optional[int]:
+        district = self.council_districts.lookup(location.x, location.y)
+        return int(district) if district is not None else None
+
+    def geocode_address(self, address: str) -> Optional[GeocodedAddress]:
+        response = self.session.get(self._geocode_url, params=self._geocode_params(address))
+        return self._parse_geocode_response(address, response.json())
+
+    def get_council_district(self, location: Location, *, wgs84: bool = False) -> Optional[int]:
+        """
+        Look up the council district containing the location. `wgs84` should be set if the location is a WGS84
+        longitude/latitude rather than a point from geocode_address.
+        """
+        if self.council_districts:
+            return self._local_council_district(location)
+        response = self.session.get(self._council_district_url, params=self._district_params(location, wgs84))
+        return self._parse_district_response(response.json())
+
     def query(self, address: str) -> Optional[AustinCityResult]:
         geocoded = self.geocode_address(address)
         if geocoded:
@@ -123,3 +192,91 @@ class AustinCityDatasource(AddressAugmentationDatasource):
             return AustinCityResult(
                 cleaned_address=geocoded.address, austin_city_council_district=district
             )
+
+    def query_with(self, address: str, known: List[Any]) -> Optional[AustinCityResult]:
+        # Skip geocoding if another source already found the exact point
+        known_location = self._known_location(known)
+        if known_location is None:
+            return self.query(address)
+        cleaned_address, location = known_location
+        district = self.get_council_district(location, wgs84=True)
+        return AustinCityResult(cleaned_address=cleaned_address, austin_city_council_district=district)
+
+    def query_batch(self, addresses: List[str]) -> List[Optional[AustinCityResult]]:
+        return self.query_batch_with(addresses, [[] for _ in addresses])
+
+    def query_batch_with(self, addresses: List[str], knowns: List[List[Any]]) -> List[Optional[AustinCityResult]]:
+        if self.max_in_flight <= 1:
+            return [self.query_with(address, known) for address, known in zip(addresses, knowns)]
+        # Each worker geocodes an address and then looks up its district, so while one worker waits on a district
+        # lookup the others are geocoding the next addresses.
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            return list(pool.map(self.query_with, addresses, knowns))
+
+    async def _aquery(self, client: httpx.AsyncClient, address: str, known: List[Any]) -> Optional[AustinCityResult]:
+        known_location = self._known_location(known)
+        if known_location is not None:
+            cleaned_address, location = known_location
+            wgs84 = True
+        else:
+            response = await client.get(self._geocode_url, params=self._geocode_params(address))
+            geocoded = self._parse_geocode_response(address, response.json())
+            if geocoded is None:
+                return None
+            cleaned_address, location = geocoded.address, geocoded.location
+            wgs84 = False
+        if self.council_districts:
+            district = self._local_council_district(location)
+        else:
+            response = await client.get(self._council_district_url, params=self._district_params(location, wgs84))
+            district = self._parse_district_response(response.json())
+        return AustinCityResult(cleaned_address=cleaned_address, austin_city_council_district=district)
+
+    async def _arecord_http_response(self, response: httpx.Response):
+        self._record_http_response(response.status_code)
+
+    # httpx's async connection pool does work proportional to its connections for every queued request, so many
+    # addresses in flight are spread over several small clients instead of one large one
+    CONNECTIONS_PER_ASYNC_CLIENT = 8
+
+    def _async_clients(self) -> List[httpx.AsyncClient]:
+        # Created on first use, since they belong to the event loop they are used in, and kept until aclose
+        if self._aclients is None:
+            count = -(-self.max_in_flight // AustinCityDatasource.CONNECTIONS_PER_ASYNC_CLIENT)
+            limits = httpx.Limits(
+                max_connections=min(self.max_in_flight, AustinCityDatasource.CONNECTIONS_PER_ASYNC_CLIENT)
+            )
+            # Share the cookies of the synchronous session
+            self._aclients = [
+                httpx.AsyncClient(
+                    cookies=self.session.cookies, limits=limits, event_hooks={"response": [self._arecord_http_response]}
+                )
+                for _ in range(count)
+            ]
+            # At most max_in_flight addresses are looked up at once, across every call
+            self._asemaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._aclients
+
+    async def aclose(self):
+        if self._aclients is not None:
+            await asyncio.gather(*(client.aclose() for client in self._aclients))
+            self._aclients = None
+
+    async def aquery(self, address: str) -> Optional[AustinCityResult]:
+        return (await self.aquery_batch([address]))[0]
+
+    async def aquery_batch(self, addresses: List[str]) -> List[Optional[AustinCityResult]]:
+        return await self.aquery_batch_with(addresses, [[] for _ in addresses])
+
+    async def aquery_batch_with(
+        self, addresses: List[str], knowns: List[List[Any]]
+    ) -> List[Optional[AustinCityResult]]:
+        clients = self._async_clients()
+
+        async def bounded(i: int, address: str, known: List[Any]) -> Optional[AustinCityResult]:
+            async with self._asemaphore:
+                return await self._aquery(clients[i % len(clients)], address, known)
+
+        return list(
+            await asyncio.gather(*(bounded(i, address, known) for i, (address, known) in enumerate(zip(addresses, knowns))))
+        )
@@ -0,0 +1,174 @@
+"""
+Benchmark augment_data offline against the replay server with synthetic responses.
+
+A synthetic membership file is generated (with some households sharing differently spelled addresses) and the
+augmentation is run over it with different concurrency, batching and caching settings, reporting rows/sec for each.
+
+    python -m augment_data.benchmark --rows 10000 --latency 0.005
+"""
+
+import argparse
+import csv
+import logging
+from pathlib import Path
+import tempfile
+import time
+from typing import Dict, List
+
+from . import __main__ as augment
+from .replay import ReplayServer
+
+logger = logging.getLogger(__name__)
+
+STREETS = [
+    "Congress Ave",
+    "Lamar Blvd",
+    "Guadalupe St",
+    "Burnet Rd",
+    "Manor Rd",
+    "Riverside Dr",
+    "Oltorf St",
+]
+
+# Name -> extra arguments for augment_data. Each configuration is run with both the Austin City and Geocodio sources.
+CONFIGURATIONS: Dict[str, List[str]] = {
+    "serial": ["--city-in-flight", "1"],
+    "city-in-flight-8": ["--city-in-flight", "8"],
+    "city-in-flight-32": ["--city-in-flight", "32"],
+    "small-batches": ["--city-in-flight", "8", "--batch-size", "50"],
+    "async-8": ["--async", "--city-in-flight", "8"],
+    "async-64": ["--async", "--city-in-flight", "64"],
+}
+
+
+def generate_members(path: Path, rows: int):
+    """Write a synthetic membership list. Every fifth member shares an address with the previous member."""
+    with open(path, "w", newline="", encoding="utf8") as file:
+        writer = csv.DictWriter(
+            file,
+            fieldnames=[
+                "first_name",
+                "last_name",
+                "address1",
+                "address2",
+                "city",
+                "state",
+                "zip",
+                "country",
+            ],
+        )
+        writer.writeheader()
+        for i in range(rows):
+            household = i - 1 if i % 5 == 4 else i
+            street = STREETS[household % len(STREETS)]
+            writer.writerow(
+                {
+                    "first_name": f"Member{i}",
+                    "last_name": "Benchmark",
+                    # Spell shared addresses differently to exercise address canonicalization
+                    "address1": (
+                        f"{100 + household} {street}"
+                        if i % 5 != 4
+                        else f"{100 + household} {street}.".upper()
+                    ),
+                    "address2": f"Apt {household % 20}" if household % 3 == 0 else "",
+                    "city": "Austin",
+                    "state": "TX",
+                    "zip": f"787{household % 50:02}",
+                    "country": "US" if i % 2 else "",
+                }
+            )
+
+
+def run(
+    server: ReplayServer, members: Path, output: Path, extra_args: List[str]
+) -> dict:
+    """Run augment_data once and return the rows/sec and number of requests made to the server."""
+    requests_before = server.request_count
+    start = time.monotonic()
+    augment.main(
+        [
+            "-i",
+            str(members),
+            "-o",
+            str(output),
+            "--interval",
+            "0",
+            "--city",
+            "--geocodio",
+            "--geocodio-key",
+            "benchmark",
+            "--city-url",
+            server.url,
+            "--geocodio-url",
+            server.url,
+        ]
+        + extra_args
+    )
+    elapsed = time.monotonic() - start
+    with open(members, "r", newline="", encoding="utf8") as file:
+        rows = sum(1 for _ in csv.DictReader(file))
+    return {
+        "rows_per_second": rows / elapsed,
+        "seconds": elapsed,
+        "requests": server.request_count - requests_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark augment_data against a local replay server."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=10000,
+        help="Number of synthetic members. (default: 10000)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.005,
+        help="Simulated network latency per request in seconds. (default: 0.005)",
+    )
+    parser.add_argument(
+        "--configuration",
+        action="append",
+        choices=list(CONFIGURATIONS),
+        help="Only run these configurations. Can be given multiple times. (default: all)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        ReplayServer(synthetic=True, latency=args.latency) as server,
+    ):
+        directory = Path(directory)
+        members = directory / "members.csv"
+        generate_members(members, args.rows)
+
+        for name in args.configuration or CONFIGURATIONS:
+            results[name] = run(
+                server, members, directory / f"{name}.csv", CONFIGURATIONS[name]
+            )
+
+        # A rerun with a warm cache should make almost no requests
+        cache_args = CONFIGURATIONS["city-in-flight-8"] + [
+            "--cache",
+            str(directory / "cache.sqlite3"),
+        ]
+        run(server, members, directory / "cold.csv", cache_args)
+        results["warm-cache"] = run(server, members, directory / "warm.csv", cache_args)
+
+    print(f"{'configuration':<20} {'rows/s':>10} {'seconds':>10} {'requests':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<20} {result['rows_per_second']:>10.1f} {result['seconds']:>10.2f} {result['requests']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
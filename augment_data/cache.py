@@ -0,0 +1,219 @@
+"""
+An on-disk cache of datasource results so that reruns over mostly unchanged membership lists do not query the
+remote services again.
+
+Results are stored in SQLite keyed by the datasource name and the canonical form of the address. Each datasource gets
+its own time to live and the cache as a whole is bounded in size, evicting the least recently used entries first.
+"""
+
+from dataclasses import asdict
+import datetime
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from augment_data.address import canonicalize_address
+from augment_data.datasource import AddressAugmentationDatasource
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    A size bounded SQLite store of datasource results.
+    """
+
+    def __init__(self, path: Path, *, max_entries: int = 100000):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (source, key)
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+        )
+        self._connection.commit()
+
+    def get_many(
+        self, source: str, keys: List[str], ttl: datetime.timedelta
+    ) -> Dict[str, Optional[dict]]:
+        """
+        Look up the stored values for the given keys. Only entries younger than `ttl` are returned.
+        The returned dict maps each found key to the stored value, which is None for cached misses.
+        """
+        now = time.time()
+        oldest = now - ttl.total_seconds()
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._connection.execute(
+                    "SELECT value FROM results WHERE source = ? AND key = ? AND created >= ?",
+                    (source, key, oldest),
+                ).fetchone()
+                if row is not None:
+                    found[key] = json.loads(row[0])
+            self._connection.executemany(
+                "UPDATE results SET accessed = ? WHERE source = ? AND key = ?",
+                [(now, source, key) for key in found],
+            )
+            self._connection.commit()
+        return found
+
+    def put_many(self, source: str, values: List[Tuple[str, Optional[dict]]]):
+        """Store (key, value) pairs for the source, replacing existing entries, and evict entries over the size bound."""
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results (source, key, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(source, key, json.dumps(value), now, now) for key, value in values],
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()
+        if count > self._max_entries:
+            logger.info(f"Evicting {count - self._max_entries} cache entries")
+            self._connection.execute(
+                "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY accessed LIMIT ?)",
+                (count - self._max_entries,),
+            )
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedDatasource(AddressAugmentationDatasource):
+    """
+    Wraps another datasource and answers queries from a ResultCache where possible.
+    Misses are cached too, so an address with no result is not queried again until its entry expires.
+    """
+
+    def __init__(
+        self,
+        source: AddressAugmentationDatasource,
+        cache: ResultCache,
+        *,
+        ttl: datetime.timedelta,
+    ):
+        self.source = source
+        self.supports_batch = source.supports_batch
+        self.result_type = source.result_type
+        self.cost = source.cost
+        self._cache = cache
+        self._ttl = ttl
+        self._name = type(source).__name__
+        # Counts of addresses answered from the cache and not, for metrics
+        self.hits = 0
+        self.misses = 0
+
+    def _decode(self, value: Optional[dict]) -> Optional[Any]:
+        if value is None:
+            return None
+        return self.source.result_type(**value)
+
+    def query(self, address: str) -> Optional[Any]:
+        return self.query_batch([address])[0]
+
+    def _lookup(
+        self, addresses: List[str]
+    ) -> Tuple[List[str], Dict[str, Optional[dict]], Dict[str, str]]:
+        """
+        Look up the addresses in the cache. Returns the key for each address, the cached values by key and the
+        addresses which are missing from the cache by key (each missing key only once, even if it appears multiple
+        times).
+        """
+        keys = [canonicalize_address(address) for address in addresses]
+        cached = self._cache.get_many(self._name, keys, self._ttl)
+        logger.info(
+            f"{self._name}: {len(cached)} of {len(set(keys))} addresses found in cache"
+        )
+        missing = {}
+        for key, address in zip(keys, addresses):
+            if key not in cached and key not in missing:
+                missing[key] = address
+        self.hits += len(set(keys)) - len(missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _store(
+        self,
+        cached: Dict[str, Optional[dict]],
+        keys: List[str],
+        results: List[Optional[Any]],
+    ):
+        values = [
+            (key, asdict(res) if res is not None else None)
+            for key, res in zip(keys, results)
+        ]
+        self._cache.put_many(self._name, values)
+        cached.update(values)
+
+    def query_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        return self.query_batch_with(addresses, [[] for _ in addresses])
+
+    def query_with(self, address: str, known: List[Any]) -> Optional[Any]:
+        return self.query_batch_with([address], [known])[0]
+
+    def query_batch_with(
+        self, addresses: List[str], knowns: List[List[Any]]
+    ) -> List[Optional[Any]]:
+        keys, cached, missing = self._lookup(addresses)
+        if missing:
+            missing_knowns = self._missing_knowns(keys, knowns, missing)
+            results = self.source.query_batch_with(
+                list(missing.values()), missing_knowns
+            )
+            self._store(cached, list(missing.keys()), results)
+        return [self._decode(cached[key]) for key in keys]
+
+    @staticmethod
+    def _missing_knowns(
+        keys: List[str], knowns: List[List[Any]], missing: Dict[str, str]
+    ) -> List[List[Any]]:
+        """The known results of cheaper sources for each missing key."""
+        known_by_key = dict(zip(keys, knowns))
+        return [known_by_key[key] for key in missing]
+
+    async def aquery(self, address: str) -> Optional[Any]:
+        return (await self.aquery_batch([address]))[0]
+
+    async def aquery_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        return await self.aquery_batch_with(addresses, [[] for _ in addresses])
+
+    async def aquery_batch_with(
+        self, addresses: List[str], knowns: List[List[Any]]
+    ) -> List[Optional[Any]]:
+        keys, cached, missing = self._lookup(addresses)
+        if missing:
+            missing_knowns = self._missing_knowns(keys, knowns, missing)
+            results = await self.source.aquery_batch_with(
+                list(missing.values()), missing_knowns
+            )
+            self._store(cached, list(missing.keys()), results)
+        return [self._decode(cached[key]) for key in keys]
+
+    async def aclose(self):
+        await self.source.aclose()
+
+
+def find_cache(source: AddressAugmentationDatasource) -> Optional[CachedDatasource]:
+    """The CachedDatasource in front of the source, looking through wrappers (which keep the wrapped source in
+    `source`), or None if it is not cached."""
+    while source is not None:
+        if isinstance(source, CachedDatasource):
+            return source
+        source = getattr(source, "source", None)
+    return None
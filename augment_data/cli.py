@@ -0,0 +1,154 @@
+"""
+Helpers shared by the augment_data command line tools (`python -m augment_data` and `augment_data.district_table`):
+reading rows in chunks, assembling their addresses, and choosing the datasources from the command line arguments.
+"""
+
+import argparse
+import datetime
+import itertools
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from . import austin_city_api, cache, datasource, districts, geocodio_api
+
+logger = logging.getLogger(__name__)
+
+
+def chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """Split an iterable of rows into lists of at most size rows."""
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def assemble_address(row: dict) -> str:
+    """Take a row dict and assemble an address from the fields address1, address2, city, state, zip, country."""
+    return (
+        f"{row.get('address1', '')} {row.get('address2', '')}, {row.get('city', '')},"
+        f" {row.get('state', '')}, {row.get('zip', '')}, {row.get('country', '')}"
+    )
+
+
+def add_source_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments used by build_sources to choose and configure the datasources."""
+    parser.add_argument(
+        "--geocodio",
+        action="store_true",
+        help="Use Geocodio to get state and federal districts.",
+    )
+    parser.add_argument(
+        "--city",
+        action="store_true",
+        help="Use the Austin City website to get city council districts",
+    )
+    parser.add_argument(
+        "--city-in-flight",
+        type=int,
+        default=1,
+        help="The number of addresses looked up on the Austin City website at once. With more than 1 the city is "
+        "queried in batches of --batch-size rows and --interval is not applied. Be careful raising this. (default: 1)",
+    )
+    parser.add_argument(
+        "--council-districts",
+        type=Path,
+        help="A GeoJSON file of the Austin City Council district boundaries. If provided, council districts are "
+        "looked up locally instead of querying the Austin City website for each address.",
+    )
+    parser.add_argument(
+        "--council-district-property",
+        type=str,
+        default="council_district",
+        help="The GeoJSON feature property holding the council district number. (default: council_district)",
+    )
+    parser.add_argument(
+        "--geocodio-key",
+        type=str,
+        default=os.environ.get("GEOCODIO_KEY"),
+        help="A Geocodio API key. You can also put the key in the environment variable GEOCODIO_KEY.",
+    )
+    parser.add_argument("--min-proportion", type=float, default=0.5)
+    parser.add_argument(
+        "--city-url",
+        type=str,
+        help="Use this server instead of the Austin City website, for example a replay server (see replay.py).",
+    )
+    parser.add_argument(
+        "--geocodio-url",
+        type=str,
+        help="Use this server instead of the Geocodio API, for example a replay server (see replay.py).",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        help="Path to an SQLite file used to cache results between runs. Addresses found in the cache are not "
+        "queried again. (default: no caching)",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=100000,
+        help="The maximum number of results kept in the cache. The least recently used are evicted first. (default: 100000)",
+    )
+    parser.add_argument(
+        "--city-cache-days",
+        type=float,
+        default=30,
+        help="How many days cached Austin City results are used for. (default: 30)",
+    )
+    parser.add_argument(
+        "--geocodio-cache-days",
+        type=float,
+        default=90,
+        help="How many days cached Geocodio results are used for. (default: 90)",
+    )
+
+
+def build_sources(
+    args: argparse.Namespace,
+) -> Tuple[List[datasource.AddressAugmentationDatasource], Optional[cache.ResultCache]]:
+    """Create the datasources chosen by the arguments from add_source_arguments, and the result cache if enabled."""
+    result_cache = None
+    if args.cache:
+        logger.info(f"Using result cache {args.cache}")
+        result_cache = cache.ResultCache(args.cache, max_entries=args.cache_max_entries)
+
+    def cached(
+        source: datasource.AddressAugmentationDatasource, days: float
+    ) -> datasource.AddressAugmentationDatasource:
+        if result_cache is None:
+            return source
+        return cache.CachedDatasource(
+            source, result_cache, ttl=datetime.timedelta(days=days)
+        )
+
+    sources: List[datasource.AddressAugmentationDatasource] = []
+    if args.city:
+        council_districts = None
+        if args.council_districts:
+            council_districts = districts.DistrictIndex.from_geojson(
+                args.council_districts, args.council_district_property
+            )
+        sources.append(
+            cached(
+                austin_city_api.AustinCityDatasource(
+                    council_districts=council_districts,
+                    max_in_flight=args.city_in_flight,
+                    base_url=args.city_url,
+                ),
+                args.city_cache_days,
+            )
+        )
+    if args.geocodio:
+        sources.append(
+            cached(
+                geocodio_api.GeocodioDatasource(
+                    key=args.geocodio_key,
+                    min_proportion=args.min_proportion,
+                    base_url=args.geocodio_url,
+                ),
+                args.geocodio_cache_days,
+            )
+        )
+    return sources, result_cache
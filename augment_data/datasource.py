@@ -1,16 +1,79 @@
 
 
 from abc import abstractmethod
-from typing import Any, Optional
+import asyncio
+from typing import Any, Callable, List, Optional
 
 
 class AddressAugmentationDatasource:
     """
     A class which provides additional information when provided an address.
     """
+
+    # Whether query_batch is cheaper than calling query once per address. Sources that set this are queried
+    # up front for a whole file instead of row by row.
+    supports_batch: bool = False
+
+    # The dataclass returned by query. Used to rebuild cached results.
+    result_type: type
+
+    # The relative cost of looking up an address. Cheaper sources are queried first so more expensive sources can use
+    # their results (see query_with).
+    cost: int = 1
+
+    # Called with the status code of every HTTP response the source receives, if set. Used to collect metrics.
+    on_http_response: Optional[Callable[[int], None]] = None
+
+    def _record_http_response(self, status_code: int):
+        if self.on_http_response is not None:
+            self.on_http_response(status_code)
+
     @abstractmethod
     def query(self, address: str) -> Optional[Any]:
         """
         Get additional information based on the provided address. 
         The return value should be an instance of a dataclass.
         """
+
+    def query_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        """
+        Get additional information for many addresses at once.
+        The return value is a list with one entry (as returned by `query`) per address in the same order.
+        By default this just calls `query` for each address.
+        """
+        return [self.query(address) for address in addresses]
+
+    def query_with(self, address: str, known: List[Any]) -> Optional[Any]:
+        """
+        Like `query`, but `known` holds the (non-empty) results of cheaper sources for the same address. Sources which
+        can use those to avoid some of their own lookups should override this. By default `known` is ignored.
+        """
+        return self.query(address)
+
+    def query_batch_with(self, addresses: List[str], knowns: List[List[Any]]) -> List[Optional[Any]]:
+        """Like `query_batch`, with the known results of cheaper sources for each address (see `query_with`)."""
+        return self.query_batch(addresses)
+
+    async def aquery(self, address: str) -> Optional[Any]:
+        """
+        Asynchronous version of `query`.
+        By default this runs `query` in a worker thread. Sources with an asynchronous HTTP client should override it.
+        """
+        return await asyncio.to_thread(self.query, address)
+
+    async def aquery_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        """
+        Asynchronous version of `query_batch`.
+        By default this runs `aquery` for every address concurrently.
+        """
+        return list(await asyncio.gather(*(self.aquery(address) for address in addresses)))
+
+    async def aquery_batch_with(self, addresses: List[str], knowns: List[List[Any]]) -> List[Optional[Any]]:
+        """Asynchronous version of `query_batch_with`."""
+        return await self.aquery_batch(addresses)
+
+    async def aclose(self):
+        """
+        Close the asynchronous clients the source keeps open between calls. Call it before the event loop the source
+        was used in ends. By default there is nothing to close.
+        """
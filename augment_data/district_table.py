@@ -0,0 +1,265 @@
+"""
+A persistent table of the districts of every member, keyed by actionkit_id, so consumers of district data do not
+have to augment a full export each time.
+
+Each member's row records a hash of the (canonical) address the districts were computed from. A refresh from a new
+export only queries the datasources for members who are new or whose address hash changed, so a monthly refresh
+costs only the members who moved. Members for whom a source found nothing are not saved, so the next refresh tries
+them again.
+
+    python -m augment_data.district_table refresh -i export.csv --table districts.sqlite3 --city --geocodio
+    python -m augment_data.district_table export --table districts.sqlite3 -o districts.csv
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import logging
+from pathlib import Path
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .address import canonicalize_address
+from .cli import add_source_arguments, assemble_address, build_sources, chunks
+from .resolver import Resolver
+
+logger = logging.getLogger(__name__)
+
+# The result fields stored for each member, as named in the augment_data output
+DISTRICT_FIELDS = [
+    "austin_city_council_district",
+    "state_representative_district",
+    "state_senate_district",
+    "federal_representative_district",
+    "school_districts",
+]
+
+
+def address_hash(row: dict) -> str:
+    """A hash of the canonical address of a membership list row."""
+    return hashlib.sha256(
+        canonicalize_address(assemble_address(row)).encode("utf8")
+    ).hexdigest()
+
+
+class DistrictTable:
+    """
+    The member to districts table in an SQLite file.
+    """
+
+    def __init__(self, path: Path):
+        self._connection = sqlite3.connect(path)
+        columns = ", ".join(f"{name} TEXT" for name in DISTRICT_FIELDS)
+        with self._connection:
+            self._connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS members (
+                    actionkit_id TEXT PRIMARY KEY,
+                    address_hash TEXT NOT NULL,
+                    {columns},
+                    updated TEXT NOT NULL
+                )
+                """)
+
+    def address_hashes(self) -> Dict[str, str]:
+        """The address hash of every member in the table by actionkit_id."""
+        return dict(
+            self._connection.execute("SELECT actionkit_id, address_hash FROM members")
+        )
+
+    def put_many(self, members: List[dict]):
+        """
+        Insert or replace members. Each member is a dict with actionkit_id, address_hash and the DISTRICT_FIELDS.
+        """
+        updated = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        columns = ["actionkit_id", "address_hash"] + DISTRICT_FIELDS + ["updated"]
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO members ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [
+                    [member["actionkit_id"], member["address_hash"]]
+                    + [member.get(name) for name in DISTRICT_FIELDS]
+                    + [updated]
+                    for member in members
+                ],
+            )
+
+    def remove_many(self, actionkit_ids: Iterable[str]):
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM members WHERE actionkit_id = ?",
+                [(actionkit_id,) for actionkit_id in actionkit_ids],
+            )
+
+    def rows(self) -> Iterator[dict]:
+        cursor = self._connection.execute("SELECT * FROM members ORDER BY actionkit_id")
+        names = [description[0] for description in cursor.description]
+        for values in cursor:
+            yield dict(zip(names, values))
+
+    def close(self):
+        self._connection.close()
+
+
+def refresh(
+    table: DistrictTable,
+    rows: Iterable[dict],
+    resolver: Resolver,
+    *,
+    batch_size: int = 1000,
+    interval: float = 0,
+    force: bool = False,
+    prune: bool = False,
+) -> dict:
+    """
+    Update the table from the rows of a membership export. Only members who are new or whose address hash changed
+    are queried, unless `force` is set. With `prune`, members missing from the export are removed from the table.
+    Members for whom any source found nothing (which may be a temporary failure) are not saved, so they are queried
+    again by the next refresh. Returns counts of the members in the export which were updated, unchanged, unresolved
+    or skipped (no actionkit_id), and of those removed.
+    """
+    known_hashes = table.address_hashes()
+    seen = set()
+    counts = {"updated": 0, "unchanged": 0, "unresolved": 0, "skipped": 0, "removed": 0}
+
+    def changed_rows() -> Iterator[dict]:
+        for row in rows:
+            actionkit_id = row.get("actionkit_id")
+            if not actionkit_id:
+                logger.warning(
+                    f"Skipping row without actionkit_id: {row.get('first_name')} {row.get('last_name')}"
+                )
+                counts["skipped"] += 1
+                continue
+            seen.add(actionkit_id)
+            row_hash = address_hash(row)
+            if not force and known_hashes.get(actionkit_id) == row_hash:
+                counts["unchanged"] += 1
+                continue
+            yield {"actionkit_id": actionkit_id, "address_hash": row_hash, "row": row}
+
+    for chunk in chunks(changed_rows(), batch_size):
+        addresses = [assemble_address(member["row"]) for member in chunk]
+        keys = [canonicalize_address(a) for a in addresses]
+        resolver.resolve_batch(keys, addresses)
+        resolved = []
+        for member, a, key in zip(chunk, addresses, keys):
+            if resolver.resolve_row(key, a):
+                time.sleep(interval)
+            if not resolver.complete(key):
+                logger.warning(
+                    f"Not saving member {member['actionkit_id']}, a source found nothing for: {a}"
+                )
+                counts["unresolved"] += 1
+                continue
+            member.update(resolver.fields(key))
+            resolved.append(member)
+        # Save each chunk as it completes, so an interrupted refresh only redoes the current chunk
+        table.put_many(resolved)
+        counts["updated"] += len(resolved)
+        logger.info(f"Updated {counts['updated']} members")
+
+    if prune:
+        removed = [
+            actionkit_id for actionkit_id in known_hashes if actionkit_id not in seen
+        ]
+        table.remove_many(removed)
+        counts["removed"] = len(removed)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Maintain a table of the districts of every member, keyed by actionkit_id."
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Be more verbose.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = subparsers.add_parser(
+        "refresh",
+        help="Update the table from a membership export, querying only new members and members whose address changed.",
+    )
+    refresh_parser.add_argument(
+        "-i", "--input", required=True, type=Path, help="Input CSV file path"
+    )
+    refresh_parser.add_argument(
+        "--table", required=True, type=Path, help="Path to the SQLite district table"
+    )
+    refresh_parser.add_argument(
+        "-n",
+        "--interval",
+        type=float,
+        default=30,
+        help="The interval in seconds between addresses queried one at a time. (default: 30 seconds)",
+    )
+    refresh_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="The number of members queried and saved at a time. (default: 1000)",
+    )
+    refresh_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Query every member, even if their address did not change. Use this after changing the sources.",
+    )
+    refresh_parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Remove members who are not in the export from the table.",
+    )
+    add_source_arguments(refresh_parser)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Write the table to a CSV file."
+    )
+    export_parser.add_argument(
+        "--table", required=True, type=Path, help="Path to the SQLite district table"
+    )
+    export_parser.add_argument(
+        "-o", "--output", required=True, type=Path, help="Output CSV file path"
+    )
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    table = DistrictTable(args.table)
+    try:
+        if args.command == "refresh":
+            sources, result_cache = build_sources(args)
+            with open(args.input, "r", newline="", encoding="utf8") as input_file:
+                counts = refresh(
+                    table,
+                    csv.DictReader(input_file),
+                    Resolver(sources),
+                    batch_size=args.batch_size,
+                    interval=args.interval,
+                    force=args.force,
+                    prune=args.prune,
+                )
+            if result_cache is not None:
+                result_cache.close()
+            print(
+                f"{counts['updated']} members updated, {counts['unchanged']} unchanged, "
+                f"{counts['unresolved']} unresolved (tried again next refresh), "
+                f"{counts['skipped']} skipped without actionkit_id, {counts['removed']} removed"
+            )
+        else:
+            with open(args.output, "w", newline="", encoding="utf8") as output_file:
+                writer = csv.DictWriter(
+                    output_file,
+                    fieldnames=["actionkit_id", "address_hash"]
+                    + DISTRICT_FIELDS
+                    + ["updated"],
+                )
+                writer.writeheader()
+                writer.writerows(table.rows())
+            logger.info(f"District table written to {args.output}")
+    finally:
+        table.close()
+
+
+if __name__ == "__main__":
+    main()
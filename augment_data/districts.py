@@ -0,0 +1,230 @@
+"""
+Local lookup of which district contains a point, using district boundaries loaded from a GeoJSON file.
+
+This avoids a remote query per address once the boundaries have been downloaded. For example the Austin City Council
+districts can be exported as GeoJSON from https://data.austintexas.gov/. Any other district layer (state house, turf,
+etc.) can be loaded the same way.
+
+Many points can be assigned at once with `DistrictIndex.lookup_many` (or `assign_districts` for any list of
+districts), which does the point in polygon tests with NumPy.
+"""
+
+from dataclasses import dataclass
+import json
+import logging
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A ring is a closed list of (x, y) points, where x is the longitude and y the latitude for GeoJSON.
+Ring = List[Tuple[float, float]]
+
+
+@dataclass(repr=True)
+class BoundingBox:
+    xmin: float
+    ymin: float
+    xmax: float
+    ymax: float
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.xmin <= x <= self.xmax and self.ymin <= y <= self.ymax
+
+    @staticmethod
+    def of_rings(rings: List[Ring]) -> "BoundingBox":
+        xs = [x for ring in rings for x, _ in ring]
+        ys = [y for ring in rings for _, y in ring]
+        return BoundingBox(xmin=min(xs), ymin=min(ys), xmax=max(xs), ymax=max(ys))
+
+
+@dataclass(repr=True)
+class District:
+    # The district identifier, taken from the feature properties
+    name: str
+    # The outer and inner rings of every polygon in the district. A point is inside the district if it is inside an
+    # odd number of rings, which handles holes and multipolygons.
+    rings: List[Ring]
+    bbox: BoundingBox
+
+    def contains(self, x: float, y: float) -> bool:
+        if not self.bbox.contains(x, y):
+            return False
+        inside = False
+        for ring in self.rings:
+            if _ring_contains(ring, x, y):
+                inside = not inside
+        return inside
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    """Ray casting point in polygon test for a single ring."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def points_in_rings(
+    xs: np.ndarray, ys: np.ndarray, rings: List[Ring], *, block_size: int = 1 << 20
+) -> np.ndarray:
+    """
+    Vectorized ray casting: return a boolean array which is True for the points inside an odd number of the rings.
+    The points are tested against every edge at once, in blocks of at most `block_size` point-edge pairs to bound
+    memory use.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    # Each edge goes from the previous point of its ring to the next. Crossing an edge of any ring toggles
+    # insideness, so the edges of all rings can be tested together.
+    starts = np.concatenate(
+        [np.roll(np.asarray(ring, dtype=float), 1, axis=0) for ring in rings]
+    )
+    ends = np.concatenate([np.asarray(ring, dtype=float) for ring in rings])
+    x1, y1 = starts[:, 0], starts[:, 1]
+    x2, y2 = ends[:, 0], ends[:, 1]
+    dy = y2 - y1
+    # Horizontal edges are never crossed, so their slope does not matter
+    slope = (x2 - x1) / np.where(dy == 0, 1, dy)
+
+    inside = np.zeros(len(xs), dtype=bool)
+    step = max(1, block_size // len(x1))
+    for start in range(0, len(xs), step):
+        x = xs[start : start + step, np.newaxis]
+        y = ys[start : start + step, np.newaxis]
+        crosses = ((y1 > y) != (y2 > y)) & (x < slope * (y - y1) + x1)
+        inside[start : start + step] = np.count_nonzero(crosses, axis=1) % 2 == 1
+    return inside
+
+
+def assign_districts(
+    xs: Sequence[float], ys: Sequence[float], districts: List[District]
+) -> List[Optional[str]]:
+    """
+    Return the name of the district containing each point, or None for points outside every district. If districts
+    overlap the first one wins, like DistrictIndex.lookup. Only points inside a district's bounding box are tested
+    against its rings.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    names: List[Optional[str]] = [None] * len(xs)
+    unassigned = np.ones(len(xs), dtype=bool)
+    for district in districts:
+        bbox = district.bbox
+        candidates = np.flatnonzero(
+            unassigned
+            & (bbox.xmin <= xs)
+            & (xs <= bbox.xmax)
+            & (bbox.ymin <= ys)
+            & (ys <= bbox.ymax)
+        )
+        if len(candidates) == 0:
+            continue
+        found = candidates[
+            points_in_rings(xs[candidates], ys[candidates], district.rings)
+        ]
+        for i in found:
+            names[i] = district.name
+        unassigned[found] = False
+    return names
+
+
+class DistrictIndex:
+    """
+    A grid index over a set of districts which answers point in district queries without any network access.
+    """
+
+    def __init__(self, districts: List[District], *, grid_size: int = 32):
+        self.districts = districts
+        self._grid_size = grid_size
+        # With no districts the empty box contains no point, so every lookup is None
+        self._bbox = BoundingBox(
+            xmin=min((d.bbox.xmin for d in districts), default=math.inf),
+            ymin=min((d.bbox.ymin for d in districts), default=math.inf),
+            xmax=max((d.bbox.xmax for d in districts), default=-math.inf),
+            ymax=max((d.bbox.ymax for d in districts), default=-math.inf),
+        )
+        self._cell_width = (self._bbox.xmax - self._bbox.xmin) / grid_size or 1
+        self._cell_height = (self._bbox.ymax - self._bbox.ymin) / grid_size or 1
+
+        # Each grid cell lists the districts whose bounding box overlaps it
+        self._cells: Dict[Tuple[int, int], List[District]] = {}
+        for district in districts:
+            col_min, row_min = self._cell(district.bbox.xmin, district.bbox.ymin)
+            col_max, row_max = self._cell(district.bbox.xmax, district.bbox.ymax)
+            for col in range(col_min, col_max + 1):
+                for row in range(row_min, row_max + 1):
+                    self._cells.setdefault((col, row), []).append(district)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        col = int((x - self._bbox.xmin) / self._cell_width)
+        row = int((y - self._bbox.ymin) / self._cell_height)
+        return (
+            min(max(col, 0), self._grid_size - 1),
+            min(max(row, 0), self._grid_size - 1),
+        )
+
+    def lookup(self, x: float, y: float) -> Optional[str]:
+        """Return the name of the district containing the point, or None if it is outside every district."""
+        if not self._bbox.contains(x, y):
+            return None
+        for district in self._cells.get(self._cell(x, y), []):
+            if district.contains(x, y):
+                return district.name
+        return None
+
+    def lookup_many(
+        self, xs: Sequence[float], ys: Sequence[float]
+    ) -> List[Optional[str]]:
+        """Return the name of the district containing each point, or None for points outside every district."""
+        return assign_districts(xs, ys, self.districts)
+
+    @staticmethod
+    def from_geojson(path: Path, name_property: str) -> "DistrictIndex":
+        """
+        Load districts from a GeoJSON FeatureCollection of Polygon or MultiPolygon features.
+        The district name is read from the feature property `name_property`. Features without it are skipped, and a
+        ValueError is raised if no feature has it.
+        """
+        with open(path, "r", encoding="utf8") as file:
+            data = json.load(file)
+
+        districts = []
+        for feature in data.get("features", []):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                logger.warning(
+                    f"Skipping feature with unsupported geometry {geometry.get('type')} in {path}"
+                )
+                continue
+            rings = [
+                [(float(point[0]), float(point[1])) for point in ring]
+                for polygon in polygons
+                for ring in polygon
+            ]
+            name = (feature.get("properties") or {}).get(name_property)
+            if name is None:
+                logger.warning(
+                    f"Skipping feature without the name property {name_property} in {path}"
+                )
+                continue
+            districts.append(
+                District(name=str(name), rings=rings, bbox=BoundingBox.of_rings(rings))
+            )
+
+        if not districts:
+            raise ValueError(
+                f"No districts with a {name_property} property found in {path}"
+            )
+        logger.info(f"Loaded {len(districts)} districts from {path}")
+        return DistrictIndex(districts)
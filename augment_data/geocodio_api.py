@@ -1,14 +1,15 @@
-from abc import abstractmethod
-from dataclasses import asdict, dataclass, field
-import logging
-import sys
+import asyncio
+from dataclasses import dataclass
 import os
-from typing import Any, List, Optional
-import geocodio
-import pprint
+from typing import List, Optional
+
+import httpx
 
 from augment_data.datasource import AddressAugmentationDatasource
 
+GEOCODIO_URL = "https://api.geocod.io"
+GEOCODIO_API_VERSION = "1.9"
+
 
 @dataclass(repr=True)
 class GeocodioResult:
@@ -17,11 +18,31 @@ class GeocodioResult:
     state_representative_district: Optional[int] = None
     state_senate_district: Optional[int] = None
     school_districts: Optional[str] = None
+    # The geocoded point (WGS84) and how accurately it was found, see acceptable_accuracy_types below
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    accuracy_type: Optional[str] = None
 
 
 class GeocodioDatasource(AddressAugmentationDatasource):
-    def __init__(self, *, key: Optional[str] = os.environ.get('GEOCODIO_KEY'), min_proportion: float = 0.5):
-        self._client = geocodio.GeocodioClient(key)
+    def __init__(
+        self,
+        *,
+        key: Optional[str] = os.environ.get('GEOCODIO_KEY'),
+        min_proportion: float = 0.5,
+        base_url: Optional[str] = None,
+        timeout: float = 60,
+    ):
+        """
+        `base_url` replaces the Geocodio API server, for example to use a replay server. `timeout` is the number of
+        seconds to wait for a response, batches of many addresses can take a while.
+        """
+        self._key = key
+        self._geocode_url = f"{base_url or GEOCODIO_URL}/v{GEOCODIO_API_VERSION}/geocode"
+        self._timeout = timeout
+        # One client for every synchronous request, so connections are reused
+        self._client = httpx.Client(timeout=timeout)
+        self._aclient: Optional[httpx.AsyncClient] = None
         self._min_proportion = min_proportion
 
     # rooftop 	The exact point was found with rooftop level accuracy
@@ -35,8 +56,75 @@ class GeocodioDatasource(AddressAugmentationDatasource):
     # state 	The point is a state centroid
     acceptable_accuracy_types = ['rooftop', 'point', 'nearest_rooftop_match', 'range_interpolation']
 
+    # The Geocodio data fields requested for every address
+    fields = ["stateleg", "school", "cd"]
+
+    # Geocodio accepts at most this many addresses in a single batch request
+    max_batch_size = 10000
+
+    supports_batch = True
+
+    result_type = GeocodioResult
+
+    # Geocodio is queried in large batches, so it is cheaper per address than the Austin City website
+    cost = 1
+
+    def _params(self) -> dict:
+        return {"api_key": self._key, "fields": ",".join(GeocodioDatasource.fields)}
+
+    def _json(self, response: httpx.Response):
+        """Record the status of the response and return its JSON, raising for error statuses."""
+        self._record_http_response(response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+    def _chunks(self, addresses: List[str]) -> List[List[str]]:
+        return [
+            addresses[start : start + GeocodioDatasource.max_batch_size]
+            for start in range(0, len(addresses), GeocodioDatasource.max_batch_size)
+        ]
+
+    def _parse_batch_response(self, addresses: List[str], data: dict) -> List[Optional[GeocodioResult]]:
+        # The batch response is in the same order as the submitted addresses
+        return [self._parse_response(address, item["response"]) for address, item in zip(addresses, data["results"])]
+
     def query(self, address: str) -> Optional[GeocodioResult]:
-        info = self._client.geocode_address(address, fields=["stateleg", "school", "cd"])
+        response = self._client.get(self._geocode_url, params={**self._params(), "q": address})
+        return self._parse_response(address, self._json(response))
+
+    def query_batch(self, addresses: List[str]) -> List[Optional[GeocodioResult]]:
+        results = []
+        for chunk in self._chunks(addresses):
+            response = self._client.post(self._geocode_url, params=self._params(), json=chunk)
+            results.extend(self._parse_batch_response(chunk, self._json(response)))
+        return results
+
+    def _async_client(self) -> httpx.AsyncClient:
+        # Created on first use, since it belongs to the event loop it is used in, and kept until aclose
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(timeout=self._timeout)
+        return self._aclient
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+    async def aquery(self, address: str) -> Optional[GeocodioResult]:
+        response = await self._async_client().get(self._geocode_url, params={**self._params(), "q": address})
+        return self._parse_response(address, self._json(response))
+
+    async def aquery_batch(self, addresses: List[str]) -> List[Optional[GeocodioResult]]:
+        client = self._async_client()
+
+        async def query_chunk(chunk: List[str]) -> List[Optional[GeocodioResult]]:
+            response = await client.post(self._geocode_url, params=self._params(), json=chunk)
+            return self._parse_batch_response(chunk, self._json(response))
+
+        results = await asyncio.gather(*(query_chunk(chunk) for chunk in self._chunks(addresses)))
+        return [res for chunk_results in results for res in chunk_results]
+
+    def _parse_response(self, address: str, info: dict) -> Optional[GeocodioResult]:
         res = None
         for result in info.get('results', []):
             accuracy_type=result.get('accuracy_type', '')
@@ -51,6 +139,11 @@ class GeocodioDatasource(AddressAugmentationDatasource):
             except LookupError:
                 pass
 
+            location = result.get('location', {})
+            res.latitude = location.get('lat')
+            res.longitude = location.get('lng')
+            res.accuracy_type = accuracy_type
+
             fields = result.get('fields', {})
 
             congressional_districts = fields.get('congressional_districts', [])
@@ -0,0 +1,219 @@
+"""
+Throughput and error metrics for augmentation runs, used to tune the interval, batching and concurrency settings.
+
+Each datasource is wrapped in an InstrumentedDatasource which records every call into a shared Metrics collector.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from augment_data.cache import find_cache
+from augment_data.datasource import AddressAugmentationDatasource
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], proportion: float) -> Optional[float]:
+    """The value below which `proportion` of the values fall (nearest rank), or None if there are no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(proportion * len(ordered)), len(ordered) - 1)
+    return ordered[index]
+
+
+@dataclass
+class SourceMetrics:
+    # Number of calls made to the datasource (a batch counts as one call)
+    calls: int = 0
+    # Number of addresses queried, over all calls
+    addresses: int = 0
+    # Number of addresses for which the datasource found nothing
+    empty_results: int = 0
+    # Number of calls which raised an exception
+    errors: int = 0
+    # Seconds taken by each call
+    latencies: List[float] = field(default_factory=list)
+    # Number of HTTP responses by status class ("2xx", "4xx", ...)
+    http_statuses: Counter = field(default_factory=Counter)
+    # Number of HTTP 429 Too Many Requests responses
+    throttled: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "addresses": self.addresses,
+            "empty_results": self.empty_results,
+            "hit_rate": (
+                (self.addresses - self.empty_results) / self.addresses
+                if self.addresses
+                else None
+            ),
+            "errors": self.errors,
+            "latency_p50_seconds": percentile(self.latencies, 0.5),
+            "latency_p95_seconds": percentile(self.latencies, 0.95),
+            "http_statuses": dict(self.http_statuses),
+            "throttled": self.throttled,
+        }
+
+
+class Metrics:
+    """
+    Collects metrics for every datasource and the progress of the run as a whole.
+    """
+
+    def __init__(self, total_rows: Optional[int] = None):
+        self.total_rows = total_rows
+        self.rows_done = 0
+        self.sources: Dict[str, SourceMetrics] = {}
+        self._instrumented: List["InstrumentedDatasource"] = []
+        self._start = time.monotonic()
+
+    def for_source(self, name: str) -> SourceMetrics:
+        return self.sources.setdefault(name, SourceMetrics())
+
+    def instrument(
+        self, source: AddressAugmentationDatasource
+    ) -> "InstrumentedDatasource":
+        instrumented = InstrumentedDatasource(source, self)
+        self._instrumented.append(instrumented)
+        return instrumented
+
+    def record_http_response(self, name: str, status_code: int):
+        metrics = self.for_source(name)
+        metrics.http_statuses[f"{status_code // 100}xx"] += 1
+        if status_code == 429:
+            metrics.throttled += 1
+
+    def row_done(self):
+        self.rows_done += 1
+
+    def progress_line(self) -> str:
+        """A one line description of the progress of the run, with an estimate of the time remaining if possible."""
+        elapsed = time.monotonic() - self._start
+        rate = self.rows_done / elapsed if elapsed > 0 else 0
+        line = f"{self.rows_done}"
+        if self.total_rows is not None:
+            line += f"/{self.total_rows}"
+        line += f" rows, {rate:.2f} rows/s"
+        if self.total_rows is not None and rate > 0:
+            remaining = (self.total_rows - self.rows_done) / rate
+            line += f", ETA {time.strftime('%H:%M:%S', time.gmtime(remaining))}"
+        return line
+
+    def print_progress(self):
+        print(f"\r{self.progress_line()}", end="", file=sys.stderr, flush=True)
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self._start
+        sources = {}
+        for name, metrics in self.sources.items():
+            sources[name] = metrics.summary()
+        for instrumented in self._instrumented:
+            cache = instrumented.cache
+            if cache is not None:
+                sources[instrumented.name]["cache_hits"] = cache.hits
+                sources[instrumented.name]["cache_misses"] = cache.misses
+        return {
+            "rows": self.rows_done,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": self.rows_done / elapsed if elapsed > 0 else None,
+            "sources": sources,
+        }
+
+    def write_summary(self, path: Path):
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(self.summary(), file, indent=2)
+        logger.info(f"Metrics written to {path}")
+
+
+class InstrumentedDatasource(AddressAugmentationDatasource):
+    """
+    Wraps another datasource (which may itself wrap others, like CachedDatasource) and records every call in Metrics.
+    """
+
+    def __init__(self, source: AddressAugmentationDatasource, metrics: Metrics):
+        self.source = source
+        self.supports_batch = source.supports_batch
+        self.result_type = source.result_type
+        self.cost = source.cost
+        self._metrics = metrics
+
+        # Find the datasource doing the actual lookups, and any cache in front of it
+        self.cache = find_cache(source)
+        inner = source
+        while hasattr(inner, "source"):
+            inner = inner.source
+        self.name = type(inner).__name__
+        inner.on_http_response = lambda status_code: metrics.record_http_response(
+            self.name, status_code
+        )
+        metrics.for_source(self.name)
+
+    def _record(self, start: float, results: List[Optional[Any]]):
+        metrics = self._metrics.for_source(self.name)
+        metrics.calls += 1
+        metrics.addresses += len(results)
+        metrics.empty_results += sum(1 for res in results if res is None)
+        metrics.latencies.append(time.monotonic() - start)
+
+    def _timed(self, call: Callable[[], List[Optional[Any]]]) -> List[Optional[Any]]:
+        start = time.monotonic()
+        try:
+            results = call()
+        except Exception:
+            self._metrics.for_source(self.name).errors += 1
+            raise
+        self._record(start, results)
+        return results
+
+    async def _atimed(
+        self, call: Callable[[], Awaitable[List[Optional[Any]]]]
+    ) -> List[Optional[Any]]:
+        start = time.monotonic()
+        try:
+            results = await call()
+        except Exception:
+            self._metrics.for_source(self.name).errors += 1
+            raise
+        self._record(start, results)
+        return results
+
+    def query(self, address: str) -> Optional[Any]:
+        return self._timed(lambda: [self.source.query(address)])[0]
+
+    def query_with(self, address: str, known: List[Any]) -> Optional[Any]:
+        return self._timed(lambda: [self.source.query_with(address, known)])[0]
+
+    def query_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        return self._timed(lambda: self.source.query_batch(addresses))
+
+    def query_batch_with(
+        self, addresses: List[str], knowns: List[List[Any]]
+    ) -> List[Optional[Any]]:
+        return self._timed(lambda: self.source.query_batch_with(addresses, knowns))
+
+    async def aquery(self, address: str) -> Optional[Any]:
+        async def call():
+            return [await self.source.aquery(address)]
+
+        return (await self._atimed(call))[0]
+
+    async def aquery_batch(self, addresses: List[str]) -> List[Optional[Any]]:
+        return await self._atimed(lambda: self.source.aquery_batch(addresses))
+
+    async def aquery_batch_with(
+        self, addresses: List[str], knowns: List[List[Any]]
+    ) -> List[Optional[Any]]:
+        return await self._atimed(
+            lambda: self.source.aquery_batch_with(addresses, knowns)
+        )
+
+    async def aclose(self):
+        await self.source.aclose()
@@ -0,0 +1,269 @@
+"""
+A local stub HTTP server standing in for the Austin City and Geocodio services, for offline regression tests and
+benchmarks of the datasources.
+
+The server can run in three modes:
+
+* record: requests are forwarded to the real services and the responses are saved to a recording file.
+* replay: requests are answered from a recording file. Requests which were not recorded get a 404, unless synthetic
+  responses are enabled.
+* synthetic: every request gets a made up but deterministic response, so any number of addresses can be used.
+
+Point the datasources at the server with their `base_url` arguments (or `--city-url` and `--geocodio-url`).
+"""
+
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import zlib
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# The real server for each path prefix handled by the stub, used when recording
+UPSTREAMS = {
+    "/arcgis/": "https://maps.austintexas.gov",
+    "/gis/": "https://maps.austintexas.gov",
+    "/government": "https://www.austintexas.gov",
+    "/v": "https://api.geocod.io",
+}
+
+# Query parameters which are not part of the recorded request, so recordings do not contain secrets
+IGNORED_PARAMS = {"api_key"}
+
+
+def request_key(method: str, path: str, query: str, body: bytes) -> str:
+    """A key identifying a request in a recording."""
+    params = sorted(
+        (k, v)
+        for k, v in parse_qsl(query, keep_blank_values=True)
+        if k not in IGNORED_PARAMS
+    )
+    key = f"{method} {path} {json.dumps(params)}"
+    if body:
+        key += f" {hashlib.sha1(body).hexdigest()}"
+    return key
+
+
+def _number(text: str, modulus: int) -> int:
+    """A deterministic number in [0, modulus) derived from text."""
+    return zlib.crc32(text.encode("utf8")) % modulus
+
+
+def _point(address: str) -> Tuple[float, float]:
+    """A deterministic (longitude, latitude) in Austin for an address."""
+    return (
+        -97.9 + _number(address, 4000) / 10000,
+        30.1 + _number(address[::-1], 4000) / 10000,
+    )
+
+
+def _synthetic_geocodio_result(address: str) -> dict:
+    if _number(address, 50) == 0:
+        return {"input": {"formatted_address": address}, "results": []}
+    longitude, latitude = _point(address)
+    district = lambda count: [
+        {"district_number": str(1 + _number(address, count)), "proportion": 1}
+    ]
+    return {
+        "input": {"formatted_address": address},
+        "results": [
+            {
+                "formatted_address": address.upper(),
+                "location": {"lat": latitude, "lng": longitude},
+                "accuracy_type": (
+                    "rooftop" if _number(address, 4) else "range_interpolation"
+                ),
+                "fields": {
+                    "congressional_districts": [
+                        {
+                            **district(38)[0],
+                            "current_legislators": [{"type": "representative"}],
+                        }
+                    ],
+                    "state_legislative_districts": {
+                        "house": district(150),
+                        "senate": district(31),
+                    },
+                    "school_districts": {
+                        "unified": {"name": "Austin Independent School District"}
+                    },
+                },
+            }
+        ],
+    }
+
+
+def synthetic_response(
+    method: str, path: str, query: str, body: bytes
+) -> Tuple[int, object]:
+    """A made up response to a request for any of the stubbed services."""
+    params = dict(parse_qsl(query, keep_blank_values=True))
+    if path.endswith("/findAddressCandidates"):
+        address = params.get("SingleLine", "")
+        if _number(address, 50) == 0:
+            return 200, {"candidates": []}
+        longitude, latitude = _point(address)
+        return 200, {
+            "candidates": [
+                {
+                    "address": address.upper(),
+                    "location": {"x": longitude, "y": latitude},
+                    "score": 100,
+                    "extent": {
+                        "xmin": longitude - 0.001,
+                        "ymin": latitude - 0.001,
+                        "xmax": longitude + 0.001,
+                        "ymax": latitude + 0.001,
+                    },
+                }
+            ]
+        }
+    if path.endswith("/MapServer/0/query"):
+        district = 1 + _number(params.get("geometry", ""), 10)
+        return 200, {"features": [{"attributes": {"COUNCIL_DISTRICT": district}}]}
+    if path.endswith("/geocode") and method == "POST":
+        addresses = json.loads(body or b"[]")
+        return 200, {
+            "results": [
+                {"query": address, "response": _synthetic_geocodio_result(address)}
+                for address in addresses
+            ]
+        }
+    if path.endswith("/geocode"):
+        return 200, _synthetic_geocodio_result(params.get("q", ""))
+    if path == "/government":
+        return 200, {}
+    return 404, {"error": f"No synthetic response for {path}"}
+
+
+class _Server(ThreadingHTTPServer):
+    # Allow many concurrent connections, otherwise benchmarks with many requests in flight wait on refused connections
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class ReplayServer:
+    """
+    The stub server. Use as a context manager, which starts the server on a free local port in a background thread
+    and saves the recording (when recording) on exit.
+    """
+
+    def __init__(
+        self,
+        recording: Optional[Path] = None,
+        *,
+        record: bool = False,
+        synthetic: bool = False,
+        latency: float = 0,
+    ):
+        """
+        `recording` is the recording file to replay from or record to. Unrecorded requests get synthetic responses
+        if `synthetic` is set. Every response is delayed by `latency` seconds to simulate the network.
+        """
+        self._recording_path = recording
+        self._record = record
+        self._synthetic = synthetic
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.responses: Dict[str, dict] = {}
+        self.request_count = 0
+        if recording is not None and recording.exists():
+            with open(recording, "r", encoding="utf8") as file:
+                self.responses = json.load(file)
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(
+        self, method: str, path: str, query: str, body: bytes
+    ) -> Tuple[int, object]:
+        with self._lock:
+            self.request_count += 1
+        key = request_key(method, path, query, body)
+        if key in self.responses:
+            recorded = self.responses[key]
+            return recorded["status"], recorded["body"]
+        if self._record:
+            status, response_body = self._forward(method, path, query, body)
+            with self._lock:
+                self.responses[key] = {"status": status, "body": response_body}
+            return status, response_body
+        if self._synthetic:
+            return synthetic_response(method, path, query, body)
+        logger.warning(f"No recorded response for {key}")
+        return 404, {"error": f"No recorded response for {key}"}
+
+    @staticmethod
+    def _forward(method: str, path: str, query: str, body: bytes) -> Tuple[int, object]:
+        upstream = next(
+            url for prefix, url in UPSTREAMS.items() if path.startswith(prefix)
+        )
+        url = f"{upstream}{path}?{query}" if query else f"{upstream}{path}"
+        response = requests.request(
+            method, url, data=body or None, headers={"content-type": "application/json"}
+        )
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive like the real services do
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, so Nagle's algorithm would delay every response
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                parts = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, response_body = server.respond(
+                    self.command, parts.path, parts.query, body
+                )
+                if server._latency:
+                    time.sleep(server._latency)
+                data = json.dumps(response_body).encode("utf8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def save(self):
+        if self._recording_path is not None and self._record:
+            with open(self._recording_path, "w", encoding="utf8") as file:
+                json.dump(self.responses, file, indent=1, sort_keys=True)
+            logger.info(
+                f"Saved {len(self.responses)} recorded responses to {self._recording_path}"
+            )
+
+    def __enter__(self) -> "ReplayServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self.save()
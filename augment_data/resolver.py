@@ -0,0 +1,161 @@
+"""
+Resolves addresses against several datasources, querying the cheapest sources first so that more expensive sources
+can reuse their results (for example the Austin City datasource skips geocoding when Geocodio found the exact point).
+"""
+
+import asyncio
+from dataclasses import asdict
+import itertools
+import logging
+from typing import Any, Dict, List, Tuple
+
+from augment_data.cache import find_cache
+from augment_data.datasource import AddressAugmentationDatasource
+
+logger = logging.getLogger(__name__)
+
+
+class Resolver:
+    """
+    Queries datasources for canonical addresses and remembers the results, so each unique address is only queried once
+    per source. Results which are None (the source found nothing) are remembered too and simply add no fields.
+    """
+
+    def __init__(self, sources: List[AddressAugmentationDatasource]):
+        # Sorting is stable, so sources of the same cost keep the order they were given in. Each source is given the
+        # results of the cheaper sources (see query_with), sources of the same cost are independent of each other.
+        self.sources = sorted(sources, key=lambda source: source.cost)
+        # Batch sources are resolved for a whole chunk of rows before the row sources, so within each group the
+        # cheapest go first.
+        self.batch_sources = [
+            source for source in self.sources if source.supports_batch
+        ]
+        self.row_sources = [
+            source for source in self.sources if not source.supports_batch
+        ]
+        self._resolved: Dict[Tuple[AddressAugmentationDatasource, str], Any] = {}
+        # Futures for the addresses being resolved by aresolve calls running at the same time, done when resolved
+        self._in_flight: Dict[
+            Tuple[AddressAugmentationDatasource, str], asyncio.Future
+        ] = {}
+
+    def _unresolved(
+        self,
+        source: AddressAugmentationDatasource,
+        keys: List[str],
+        addresses: List[str],
+    ) -> Dict[str, str]:
+        """Return the addresses not yet resolved for the source by canonical address, each canonical address once."""
+        unresolved = {}
+        for key, address in zip(keys, addresses):
+            if (
+                (source, key) not in self._resolved
+                and (source, key) not in self._in_flight
+                and key not in unresolved
+            ):
+                unresolved[key] = address
+        return unresolved
+
+    def _known(self, source: AddressAugmentationDatasource, key: str) -> List[Any]:
+        """The non-empty results of the sources cheaper than `source` for the canonical address."""
+        known = []
+        for other in self.sources:
+            if other.cost >= source.cost:
+                break
+            res = self._resolved.get((other, key))
+            if res is not None:
+                known.append(res)
+        return known
+
+    def resolve_batch(self, keys: List[str], addresses: List[str]):
+        """Query the batch sources for all addresses which have not been resolved yet."""
+        for source in self.batch_sources:
+            unresolved = self._unresolved(source, keys, addresses)
+            if not unresolved:
+                continue
+            logger.info(
+                f"{type(source).__name__}: Querying {len(unresolved)} unique addresses for {len(keys)} rows as a batch"
+            )
+            knowns = [self._known(source, key) for key in unresolved]
+            results = source.query_batch_with(list(unresolved.values()), knowns)
+            for key, res in zip(unresolved.keys(), results):
+                self._resolved[(source, key)] = res
+
+    def resolve_row(self, key: str, address: str) -> bool:
+        """
+        Query the row sources for the address if it has not been resolved yet. Returns whether any source went to the
+        network, so answers from the result cache don't count.
+        """
+        queried = False
+        for source in self.row_sources:
+            if (source, key) not in self._resolved:
+                cache = find_cache(source)
+                misses = cache.misses if cache is not None else 0
+                self._resolved[(source, key)] = source.query_with(
+                    address, self._known(source, key)
+                )
+                if cache is None or cache.misses > misses:
+                    queried = True
+        return queried
+
+    async def aresolve(self, keys: List[str], addresses: List[str]):
+        """
+        Query every source asynchronously for all addresses which have not been resolved yet, cheapest first. Sources
+        of the same cost don't use each other's results, so they are queried at the same time. Several calls can run
+        at once (for example for consecutive chunks of rows), an address being resolved by one is not queried again
+        by another.
+        """
+        for _, group in itertools.groupby(self.sources, key=lambda source: source.cost):
+            await asyncio.gather(
+                *(self._aresolve_source(source, keys, addresses) for source in group)
+            )
+
+    async def _aresolve_source(
+        self,
+        source: AddressAugmentationDatasource,
+        keys: List[str],
+        addresses: List[str],
+    ):
+        unresolved = self._unresolved(source, keys, addresses)
+        # The addresses other calls are resolving
+        waiting = {
+            self._in_flight[(source, key)]
+            for key in keys
+            if (source, key) in self._in_flight
+        }
+        if unresolved:
+            logger.info(
+                f"{type(source).__name__}: Querying {len(unresolved)} unique addresses asynchronously"
+            )
+            done = asyncio.get_running_loop().create_future()
+            for key in unresolved:
+                self._in_flight[(source, key)] = done
+            try:
+                knowns = [self._known(source, key) for key in unresolved]
+                results = await source.aquery_batch_with(
+                    list(unresolved.values()), knowns
+                )
+                for key, res in zip(unresolved.keys(), results):
+                    self._resolved[(source, key)] = res
+            finally:
+                for key in unresolved:
+                    del self._in_flight[(source, key)]
+                # Addresses left unresolved by an error are queried again by resolve_batch or resolve_row
+                done.set_result(None)
+        await asyncio.gather(*waiting)
+
+    def complete(self, key: str) -> bool:
+        """Whether every source found a result for the canonical address."""
+        return all(
+            self._resolved.get((source, key)) is not None for source in self.sources
+        )
+
+    def fields(self, key: str) -> dict:
+        """The merged fields of every source's result for the canonical address."""
+        merged = {}
+        for source in self.sources:
+            res = self._resolved.get((source, key))
+            logger.info(f"{type(source).__name__}: {res}")
+            if res is not None:
+                merged.update(asdict(res))
+        return merged
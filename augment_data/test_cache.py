@@ -0,0 +1,58 @@
+"""
+Checks that reruns answered from the result cache skip the interval between lookups, using the replay server.
+
+    python -m pytest augment_data/test_cache.py
+"""
+
+import csv
+from pathlib import Path
+
+from . import __main__ as augment
+from .replay import ReplayServer
+
+
+def write_members(path: Path, rows: int):
+    with open(path, "w", newline="", encoding="utf8") as file:
+        writer = csv.DictWriter(
+            file, fieldnames=["first_name", "address1", "city", "state", "zip"]
+        )
+        writer.writeheader()
+        for i in range(rows):
+            writer.writerow(
+                {
+                    "first_name": f"Member {i}",
+                    "address1": f"{100 + i} Congress Ave",
+                    "city": "Austin",
+                    "state": "TX",
+                    "zip": "78701",
+                }
+            )
+
+
+def test_cached_rerun_does_not_sleep(tmp_path: Path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(augment.time, "sleep", sleeps.append)
+    members = tmp_path / "members.csv"
+    write_members(members, 5)
+
+    with ReplayServer(synthetic=True) as server:
+        argv = [
+            "-i",
+            str(members),
+            "-o",
+            str(tmp_path / "output.csv"),
+            "--city",
+            "--city-url",
+            server.url,
+            "--cache",
+            str(tmp_path / "cache.sqlite3"),
+        ]
+        augment.main(argv)
+        assert len(sleeps) == 5
+
+        sleeps.clear()
+        requests_before = server.request_count
+        augment.main(argv)
+        assert sleeps == []
+        # Only the session set up request of the Austin City datasource
+        assert server.request_count - requests_before == 1
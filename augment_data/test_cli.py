@@ -1,9 +1,11 @@
+import contextlib
 from dataclasses import asdict
+from pathlib import Path
 import logging
 import os
 import pprint
 
-import austin_city_api, geocodio_api
+from . import austin_city_api, geocodio_api, replay
 
 
 if __name__ == "__main__":
@@ -14,24 +16,33 @@ if __name__ == "__main__":
     parser.add_argument("--city", "-c", action="store_true", help="Austin City Website")
     parser.add_argument("--geocodio-key", type=str, default=os.environ.get('GEOCODIO_KEY'))
     parser.add_argument("--min-proportion", type=float, default=0.5)
+    parser.add_argument("--record", type=Path, help="Record the responses of the live services to this file")
+    parser.add_argument("--replay", type=Path, help="Replay responses from a file made with --record instead of using the live services")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
-    sources = []
-    if args.city:
-        sources.append(austin_city_api.AustinCityDatasource())
-    if args.geocodio:
-        sources.append(geocodio_api.GeocodioDatasource(key=args.geocodio_key, min_proportion=args.min_proportion))
-
-    address = args.address
-
-    print(f"Testing with address: {address}")
-    
-    full_result = {"address": address}
-
-    for source in sources:
-        res = source.query(address)
-        print(f"{type(source).__name__}: {res}")
-        full_result.update(asdict(res))
-    print("Full result:")
-    pprint.pprint(full_result)
+    with contextlib.ExitStack() as stack:
+        base_url = None
+        if args.record or args.replay:
+            server = stack.enter_context(replay.ReplayServer(args.record or args.replay, record=args.record is not None))
+            base_url = server.url
+
+        sources = []
+        if args.city:
+            sources.append(austin_city_api.AustinCityDatasource(base_url=base_url))
+        if args.geocodio:
+            sources.append(geocodio_api.GeocodioDatasource(key=args.geocodio_key, min_proportion=args.min_proportion, base_url=base_url))
+
+        address = args.address
+
+        print(f"Testing with address: {address}")
+        
+        full_result = {"address": address}
+
+        for source in sources:
+            res = source.query(address)
+            print(f"{type(source).__name__}: {res}")
+            if res is not None:
+                full_result.update(asdict(res))
+        print("Full result:")
+        pprint.pprint(full_result)
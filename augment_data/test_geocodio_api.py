@@ -0,0 +1,35 @@
+"""
+Checks that the HTTP status of Geocodio errors reaches the metrics, using the replay server.
+
+    python -m pytest augment_data/test_geocodio_api.py
+"""
+
+import httpx
+import pytest
+
+from .geocodio_api import GeocodioDatasource
+from .metrics import Metrics
+from .replay import ReplayServer
+
+
+class ThrottlingServer(ReplayServer):
+    """A stub server answering every request with 429 Too Many Requests."""
+
+    def respond(self, method: str, path: str, query: str, body: bytes):
+        return 429, {"error": "Too many requests"}
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_throttled_requests_are_counted(batch: bool):
+    metrics = Metrics()
+    with ThrottlingServer() as server:
+        source = metrics.instrument(GeocodioDatasource(key="test", base_url=server.url))
+        with pytest.raises(httpx.HTTPStatusError):
+            if batch:
+                source.query_batch(["1 Congress Ave, Austin, TX 78701"])
+            else:
+                source.query("1 Congress Ave, Austin, TX 78701")
+    metrics = metrics.sources["GeocodioDatasource"]
+    assert metrics.throttled == 1
+    assert metrics.http_statuses["4xx"] == 1
+    assert metrics.errors == 1
@@ -0,0 +1,110 @@
+"""
+Replays the recorded responses in fixtures/recording.json through the Austin City and Geocodio datasources, so
+changes to how they build requests or parse responses are caught without network access. The recording is only
+replayed, requests which were not recorded get a 404.
+
+    python -m pytest augment_data/test_replay.py
+"""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from .austin_city_api import AustinCityDatasource, AustinCityResult
+from .geocodio_api import GeocodioDatasource, GeocodioResult
+from .replay import ReplayServer
+
+RECORDING = Path(__file__).parent / "fixtures" / "recording.json"
+
+CONGRESS = "1100 Congress Ave, Austin, TX 78701"
+SECOND = "301 W 2nd St, Austin, TX 78701"
+
+CONGRESS_GEOCODIO = GeocodioResult(
+    cleaned_address="1100 CONGRESS AVE, AUSTIN, TX 78701",
+    federal_representative_district=37,
+    state_representative_district=67,
+    state_senate_district=8,
+    school_districts="Austin Independent School District",
+    latitude=30.181900000000002,
+    longitude=-97.7684,
+    accuracy_type="range_interpolation",
+)
+SECOND_GEOCODIO = GeocodioResult(
+    cleaned_address="301 W 2ND ST, AUSTIN, TX 78701",
+    federal_representative_district=29,
+    state_representative_district=67,
+    state_senate_district=13,
+    school_districts="Austin Independent School District",
+    latitude=30.398,
+    longitude=-97.55340000000001,
+    accuracy_type="rooftop",
+)
+CONGRESS_CITY = AustinCityResult(
+    cleaned_address="1100 CONGRESS AVE, AUSTIN, TX 78701",
+    austin_city_council_district=5,
+)
+SECOND_CITY = AustinCityResult(
+    cleaned_address="301 W 2ND ST, AUSTIN, TX 78701",
+    austin_city_council_district=10,
+)
+
+
+@pytest.fixture
+def server():
+    with ReplayServer(RECORDING) as server:
+        yield server
+
+
+def test_geocodio(server: ReplayServer):
+    source = GeocodioDatasource(key="test", base_url=server.url)
+    assert source.query(CONGRESS) == CONGRESS_GEOCODIO
+    assert source.query(SECOND) == SECOND_GEOCODIO
+    assert source.query_batch([CONGRESS, SECOND]) == [
+        CONGRESS_GEOCODIO,
+        SECOND_GEOCODIO,
+    ]
+
+
+def test_geocodio_async(server: ReplayServer):
+    source = GeocodioDatasource(key="test", base_url=server.url)
+
+    async def query():
+        try:
+            return await source.aquery(CONGRESS), await source.aquery_batch(
+                [CONGRESS, SECOND]
+            )
+        finally:
+            await source.aclose()
+
+    assert asyncio.run(query()) == (
+        CONGRESS_GEOCODIO,
+        [CONGRESS_GEOCODIO, SECOND_GEOCODIO],
+    )
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 4])
+def test_austin_city(server: ReplayServer, max_in_flight: int):
+    source = AustinCityDatasource(max_in_flight=max_in_flight, base_url=server.url)
+    assert source.query(CONGRESS) == CONGRESS_CITY
+    assert source.query_batch([CONGRESS, SECOND]) == [CONGRESS_CITY, SECOND_CITY]
+
+
+def test_austin_city_async(server: ReplayServer):
+    source = AustinCityDatasource(max_in_flight=4, base_url=server.url)
+
+    async def query():
+        try:
+            return await source.aquery_batch([CONGRESS, SECOND])
+        finally:
+            await source.aclose()
+
+    assert asyncio.run(query()) == [CONGRESS_CITY, SECOND_CITY]
+
+
+def test_austin_city_uses_rooftop_geocodio_point(server: ReplayServer):
+    source = AustinCityDatasource(base_url=server.url)
+    requests_before = server.request_count
+    assert source.query_with(SECOND, [SECOND_GEOCODIO]) == SECOND_CITY
+    # Only the council district lookup, the address is not geocoded again
+    assert server.request_count - requests_before == 1
@@ -0,0 +1,40 @@
+"""
+Checks that --resume refuses to append to an output written with other columns, using the replay server.
+
+    python -m pytest augment_data/test_resume.py
+"""
+
+from pathlib import Path
+
+import pytest
+
+from . import __main__ as augment
+from .replay import ReplayServer
+from .test_cache import write_members
+
+
+def test_resume_with_other_sources_fails(tmp_path: Path):
+    members = tmp_path / "members.csv"
+    output = tmp_path / "output.csv"
+    write_members(members, 3)
+
+    with ReplayServer(synthetic=True) as server:
+        argv = ["-i", str(members), "-o", str(output), "--interval", "0"]
+        city = ["--city", "--city-url", server.url]
+        geocodio = [
+            "--geocodio",
+            "--geocodio-key",
+            "test",
+            "--geocodio-url",
+            server.url,
+        ]
+        augment.main(argv + city)
+        written = output.read_text(encoding="utf8")
+
+        # Resuming with the same sources keeps the output
+        augment.main(argv + city + ["--resume"])
+        assert output.read_text(encoding="utf8") == written
+
+        with pytest.raises(Exception, match="Cannot resume"):
+            augment.main(argv + city + geocodio + ["--resume"])
+        assert output.read_text(encoding="utf8") == written